@@ -5,325 +5,2937 @@ PyWebView API 服务器示例
 """
 
 import webview
+import argparse
 import threading
 import json
 import time
-from datetime import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import sqlite3
+import base64
+import re
+import math
+import zlib
 import os
+import bisect
+import heapq
+import codecs
+import socket
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class StorageProfile:
+    """SQLite 存储配置
+
+    journal_mode 写入数据库文件后持久生效，其余 PRAGMA 按连接设置。
+    """
+
+    def __init__(self, journal_mode="WAL", synchronous="NORMAL",
+                 mmap_size=256 * 1024 * 1024, cache_size=-16000, busy_timeout=5000,
+                 auto_vacuum="INCREMENTAL"):
+        self.journal_mode = journal_mode
+        # 删除过期日志分区后用 incremental_vacuum 回收空间，使数据库文件不无限增长
+        self.auto_vacuum = auto_vacuum
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size  # 负数表示以 KiB 为单位
+        self.busy_timeout = busy_timeout
+
+    def connection_pragmas(self):
+        """每个连接需要设置的 PRAGMA"""
+        return {
+            "foreign_keys": "ON",
+            "busy_timeout": self.busy_timeout,
+            "synchronous": self.synchronous,
+            "mmap_size": self.mmap_size,
+            "cache_size": self.cache_size
+        }
+
+STORAGE_PROFILES = {
+    # 并发读写：WAL 日志，读不阻塞写
+    "wal": StorageProfile(),
+    # 与旧版本一致的回滚日志模式
+    "rollback": StorageProfile(journal_mode="DELETE", synchronous="FULL", mmap_size=0,
+                               cache_size=-2000, auto_vacuum="NONE")
+}
+
+class DatabaseWriter:
+    """单写线程
+
+    所有写操作排队交给专用线程执行，读操作仍由连接池并发处理。
+    队列中积压的多个写操作合并到一个事务中提交，每个写操作使用独立的
+    SAVEPOINT，失败时只回滚自身。
+    """
+
+    def __init__(self, connect, max_batch=64):
+        self.connect = connect
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """提交写操作，返回 Future；func 的第一个参数为写连接"""
+        future = Future()
+        self._queue.put((func, args, future))
+        return future
+
+    def execute(self, func, *args, timeout=None):
+        """提交写操作并等待结果"""
+        return self.submit(func, *args).result(timeout)
+
+    def _run(self):
+        conn = self.connect()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                stop = False
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._apply(conn, batch)
+                if stop:
+                    break
+        finally:
+            conn.close()
+
+    def _apply(self, conn, batch):
+        """在一个事务中执行一批写操作"""
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT mutation")
+                try:
+                    results.append((future, True, func(conn, *args)))
+                    conn.execute("RELEASE mutation")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO mutation")
+                    conn.execute("RELEASE mutation")
+                    results.append((future, False, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for func, args, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, ok, value in results:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def close(self):
+        """处理完队列中剩余的写操作后停止写线程"""
+        self._queue.put(None)
+        self._thread.join()
+
+class ConnectionPool:
+    """SQLite 连接池
+
+    维护有上限的一组可复用连接：同一线程重复借用时复用已借出的连接，
+    空闲过久的连接在借出前做健康检查，并统计借用等待时间。
+    """
+
+    # 每个连接缓存的预编译语句数量，分页 SQL 按字段组合会有多种形态
+    cached_statements = 256
+
+    def __init__(self, db_file, max_size=8, timeout=5.0,
+                 health_check_interval=30.0, pragmas=None):
+        self.db_file = db_file
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.pragmas = pragmas if pragmas is not None else {
+            "foreign_keys": "ON",
+            "busy_timeout": int(timeout * 1000)
+        }
+        # 空闲连接栈 [(连接, 归还时间)]，后进先出
+        self._idle = []
+        self._lock = threading.Lock()
+        # 有连接归还或连接名额空出（丢弃失效连接）时通知等待的线程
+        self._available = threading.Condition(self._lock)
+        self._local = threading.local()
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+        self._metrics = {
+            "acquired": 0,
+            "waited": 0,
+            "wait_time_total_ms": 0.0,
+            "wait_time_max_ms": 0.0,
+            "timeouts": 0,
+            "discarded": 0
+        }
+
+    def create_connection(self, isolation_level=""):
+        """创建新连接并应用 PRAGMA 设置"""
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=self.timeout,
+            check_same_thread=False,
+            isolation_level=isolation_level,
+            cached_statements=self.cached_statements
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        """检查空闲过久的连接是否仍然可用"""
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        """丢弃失效连接"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._available:
+            self._created -= 1
+            self._metrics["discarded"] += 1
+            self._available.notify()
+
+    def _checkout(self):
+        """从池中取出连接，必要时新建或等待"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            with self._available:
+                while True:
+                    if self._closed:
+                        raise sqlite3.ProgrammingError("连接池已关闭")
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        create = False
+                        break
+                    if self._created < self.max_size:
+                        self._created += 1
+                        create = True
+                        break
+                    # 连接已用尽，等待其他线程归还或丢弃连接
+                    waited = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._metrics["timeouts"] += 1
+                        raise TimeoutError("等待数据库连接超时")
+                    self._available.wait(remaining)
+
+            if create:
+                try:
+                    conn = self.create_connection()
+                except Exception:
+                    with self._available:
+                        self._created -= 1
+                        self._available.notify()
+                    raise
+                break
+            if self._is_healthy(conn, last_used):
+                break
+            self._discard(conn)
+
+        wait_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._in_use += 1
+            self._metrics["acquired"] += 1
+            if waited:
+                self._metrics["waited"] += 1
+                self._metrics["wait_time_total_ms"] += wait_ms
+                self._metrics["wait_time_max_ms"] = max(self._metrics["wait_time_max_ms"], wait_ms)
+        return conn
+
+    def acquire(self):
+        """借出连接（同一线程内可重入）"""
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            held[1] += 1
+            return held[0]
+
+        conn = self._checkout()
+        self._local.held = [conn, 1]
+        return conn
+
+    def release(self, conn):
+        """归还连接"""
+        held = getattr(self._local, "held", None)
+        if held is None or held[0] is not conn:
+            raise sqlite3.ProgrammingError("归还的连接不属于当前线程")
+        held[1] -= 1
+        if held[1] > 0:
+            return
+        self._local.held = None
+
+        with self._lock:
+            self._in_use -= 1
+
+        if not self._closed and conn.in_transaction:
+            # 未提交的事务不能带回池中
+            conn.rollback()
+        with self._available:
+            if not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._available.notify()
+                return
+        self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """以上下文管理器形式借用连接"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """获取连接池指标"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics.update({
+                "max_size": self.max_size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": len(self._idle)
+            })
+        if metrics["waited"]:
+            metrics["wait_time_avg_ms"] = metrics["wait_time_total_ms"] / metrics["waited"]
+        else:
+            metrics["wait_time_avg_ms"] = 0.0
+        return metrics
+
+    def close(self):
+        """关闭连接池中的所有空闲连接"""
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            # 唤醒等待者，使其得到“连接池已关闭”错误
+            self._available.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+class StatisticsEngine:
+    """统计引擎
+
+    启动时通过 COUNT(*) / GROUP BY 聚合查询计算一次，之后由写操作在
+    事务提交后增量维护计数器，读取统计信息为 O(1)。
+    """
+
+    TASK_STATUSES = ("pending", "in_progress", "completed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._user_total = 0
+        self._task_status = {}
+
+    def load(self, conn):
+        """用聚合查询重新计算计数器"""
+        user_total = conn.execute(USER_COUNT_SQL).fetchone()[0]
+        task_status = dict(conn.execute(TASK_STATUS_COUNT_SQL).fetchall())
+        with self._lock:
+            self._user_total = user_total
+            self._task_status = task_status
+
+    def user_added(self, count=1):
+        with self._lock:
+            self._user_total += count
+
+    def task_added(self, status="pending", count=1):
+        with self._lock:
+            self._task_status[status] = self._task_status.get(status, 0) + count
+
+    def task_status_changed(self, old_status, new_status):
+        if old_status == new_status:
+            return
+        with self._lock:
+            self._task_status[old_status] = self._task_status.get(old_status, 0) - 1
+            self._task_status[new_status] = self._task_status.get(new_status, 0) + 1
+
+    def snapshot(self):
+        """获取当前统计信息"""
+        with self._lock:
+            task_stats = {"total": sum(self._task_status.values())}
+            for status in self.TASK_STATUSES:
+                task_stats[status] = self._task_status.get(status, 0)
+            for status, count in self._task_status.items():
+                if status not in task_stats and count:
+                    task_stats[status] = count
+            return {
+                "users": {"total": self._user_total},
+                "tasks": task_stats
+            }
+
+# 分页参数
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# 各表可返回的字段（按列顺序）
+TABLE_FIELDS = {
+    "users": ("id", "name", "email", "age", "created_at"),
+    "tasks": ("id", "title", "description", "status", "priority", "created_at", "completed_at")
+}
+LOG_FIELDS = ("id", "level", "message", "created_at")
+
+# 数据库结构迁移：(版本号, 说明, SQL 语句列表)，版本号记录在 PRAGMA user_version 中
+MIGRATIONS = [
+    (1, "创建用户、任务、日志表", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            age INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            status TEXT DEFAULT 'pending',
+            priority TEXT DEFAULT 'medium',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            level TEXT NOT NULL,
+            message TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        '''
+    ]),
+    (2, "键集分页索引", [
+        "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at, id)"
+    ]),
+    (3, "任务状态与日志索引", [
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_created_at ON logs(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_level_created_at ON logs(level, created_at)"
+    ])
+]
+
+# 查询语句
+USER_COUNT_SQL = "SELECT COUNT(*) FROM users"
+TASK_STATUS_COUNT_SQL = "SELECT status, COUNT(*) FROM tasks GROUP BY status"
+TASK_STATUS_SQL = "SELECT status FROM tasks WHERE id = ?"
+# 只返回已确认落盘的日志（id <= 水位线），缓冲区中的日志由 LogSink 提供；
+# "+id" 避免优化器改用主键范围扫描而放弃 created_at 索引
+RECENT_LOGS_SQL = "SELECT * FROM logs WHERE +id <= ? ORDER BY created_at DESC LIMIT ?"
+MAX_LOG_ID_SQL = "SELECT MAX(id) FROM logs"
+OLD_LOG_DAYS_SQL = "SELECT DISTINCT substr(created_at, 1, 10) FROM logs WHERE created_at < ?"
+# 按天移动日志时复制与删除使用同一范围，只删除已复制到分区的行
+COPY_LOG_DAY_SQL = "SELECT id, level, message, created_at FROM logs WHERE created_at >= ? AND created_at < ?"
+DELETE_LOG_DAY_SQL = "DELETE FROM logs WHERE created_at >= ? AND created_at < ?"
+INSERT_LOGS_SQL = "INSERT INTO logs (level, message, created_at) VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))"
+
+# 批量写入单次请求的条目上限
+MAX_BATCH_ITEMS = 10000
+
+# 批量写入各表的字段校验规则：(字段, 类型, 是否必填)，必填字段不能为空
+BATCH_FIELD_RULES = {
+    "users": (("name", str, True), ("email", str, True), ("age", int, False)),
+    "tasks": (("title", str, True), ("description", str, False), ("priority", str, False)),
+    "logs": (("level", str, False), ("message", str, True), ("created_at", str, False))
+}
+# 单条日志的校验规则
+LOG_ENTRY_RULES = (("level", str, True), ("message", str, True))
+
+def normalize_timestamp(value):
+    """把 ISO 8601 时间转换为与 CURRENT_TIMESTAMP 一致的 UTC 格式
+
+    不带时区的时间按 UTC 处理，无法解析时抛出 ValueError。
+    """
+    parsed = datetime.fromisoformat(value.strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def validate_item(item, rules):
+    """按规则校验一个条目，返回错误说明，通过时返回 None"""
+    if not isinstance(item, dict):
+        return "条目必须是 JSON 对象"
+    for name, kind, required in rules:
+        value = item.get(name)
+        if value is None or (required and value == ""):
+            if required:
+                return f"缺少 {name}"
+            continue
+        # bool 是 int 的子类，需单独排除
+        if not isinstance(value, kind) or isinstance(value, bool):
+            return f"{name} 必须是{'字符串' if kind is str else '整数'}"
+    return None
+
+def build_page_sql(table, columns, with_cursor):
+    """生成按 (created_at, id) 倒序的键集分页查询"""
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if with_cursor:
+        sql += " WHERE (created_at, id) < (?, ?)"
+    return sql + " ORDER BY created_at DESC, id DESC LIMIT ?"
+
+# EXPLAIN QUERY PLAN 中表示全表扫描的行，例如 "SCAN users"
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (TABLE )?\w+$')
+
+def encode_cursor(created_at, row_id):
+    """把 (created_at, id) 编码为分页游标"""
+    raw = json.dumps([created_at, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw.decode('utf-8'))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if not isinstance(row_id, int):
+        raise ValueError("无效的分页游标")
+    return created_at, row_id
+
+class RowStream:
+    """按页读取的查询结果
+
+    遍历时才借用连接，读完整页后立即归还，再逐行产出：向慢客户端写出
+    响应时不占用连接池中的连接，也不持有读快照（否则会阻止 WAL 检查点）。
+    查询必须带 LIMIT，结果大小由分页上限约束。每行按 fields 顺序以元组
+    给出，不再逐行构造字典。设置 page_limit 时多读一行用于判断是否还有
+    下一页，遍历结束后 next_cursor 可用。
+    """
+
+    def __init__(self, pool, sql, params, columns, fields, page_limit=None):
+        self.pool = pool
+        self.sql = sql
+        self.params = params
+        self.columns = columns
+        self.fields = fields
+        self.page_limit = page_limit
+        self.next_cursor = None
+
+    def __iter__(self):
+        count = len(self.fields)
+        trim = count < len(self.columns)
+        with self.pool.connection() as conn:
+            cursor = conn.execute(self.sql, self.params)
+            try:
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        if self.page_limit is not None and len(rows) > self.page_limit:
+            last = rows[self.page_limit - 1]
+            self.next_cursor = encode_cursor(
+                last[self.columns.index("created_at")], last[self.columns.index("id")]
+            )
+            del rows[self.page_limit:]
+        for row in rows:
+            yield row[:count] if trim else row
+
+def rows_to_dicts(fields, rows):
+    """把元组行转换为字典列表，供 Python 调用方使用"""
+    return [dict(zip(fields, row)) for row in rows]
+
+def json_value(value):
+    """把 SQLite 取出的值转换为 JSON 可表示的值
+
+    BLOB 转为 base64 字符串；NaN、Infinity 不是合法 JSON，输出为 null。
+    """
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def _encode_float(value):
+    return float.__repr__(value) if math.isfinite(value) else 'null'
+
+def _encode_bytes(value):
+    return '"' + base64.b64encode(value).decode('ascii') + '"'
+
+class RowEncoder:
+    """把元组行直接编码为紧凑 JSON 对象
+
+    按字段预先生成 '{"id":%s,"name":%s}' 形式的模板，每个值按类型选择
+    编码函数后一次格式化，省去构造字典和 json.dumps 的通用分派。
+    值的转换规则与 json_value 一致。
+    """
+
+    _converters = {
+        str: json.encoder.encode_basestring,
+        int: int.__repr__,
+        float: _encode_float,
+        bytes: _encode_bytes,
+        type(None): lambda value: 'null',
+    }
+    _instances = {}
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        members = ','.join(json.dumps(name).replace('%', '%%') + ':%s' for name in self.fields)
+        self.template = '{' + members + '}'
+
+    @classmethod
+    def for_fields(cls, fields):
+        """按字段组合复用编码器"""
+        key = tuple(fields)
+        encoder = cls._instances.get(key)
+        if encoder is None:
+            encoder = cls._instances.setdefault(key, cls(key))
+        return encoder
+
+    def encode(self, row):
+        """编码一行，返回 UTF-8 字节"""
+        converters = self._converters
+        values = tuple(
+            converters[type(value)](value) if type(value) in converters
+            else json.dumps(json_value(value), ensure_ascii=False, allow_nan=False)
+            for value in row
+        )
+        return (self.template % values).encode('utf-8')
+
+def sqlite_timestamp():
+    """与 SQLite CURRENT_TIMESTAMP 格式一致的 UTC 时间"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+class LogSink:
+    """缓冲日志写入器
+
+    日志先放入内存缓冲区，由后台线程在条数达到 batch_size 或距上次写入
+    超过 flush_interval 秒时批量写入数据库。缓冲区满时 put 最多等待
+    put_timeout 秒，仍无空间则拒绝写入（背压）。
+
+    watermark 是已落盘日志的最大 id。读取时数据库只查 id <= watermark 的
+    部分，其余由缓冲区快照补齐，保证既不重复也不遗漏。
+
+    write_batch 返回逐条结果（新日志的 id，失败的为异常对象）。写入失败的
+    条目不会放回缓冲区，而是计入 dropped 并保留最近的若干条在 rejected 中，
+    避免一条坏数据反复重试、堵住其后的所有日志。
+    """
+
+    def __init__(self, write_batch, watermark=0, capacity=10000, batch_size=500,
+                 flush_interval=1.0, put_timeout=1.0, on_flush=None):
+        self.write_batch = write_batch
+        # 缓冲日志落盘且水位线推进后调用，此后读到的日志才带有 id
+        self.on_flush = on_flush
+        self.watermark = watermark
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._buffer = deque()
+        self._in_flight = []
+        self._cond = threading.Condition()
+        # 串行化所有日志写入，使水位线推进与清空 in_flight 同时发生
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self.dropped = 0
+        self.rejected = deque(maxlen=100)
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+
+    def put(self, level, message, timeout=None):
+        """放入一条日志，缓冲区已满且等待超时时返回 False
+
+        timeout 默认为 put_timeout，为 0 时不等待。
+        """
+        entry = (None, level, message, sqlite_timestamp())
+        if timeout is None:
+            timeout = self.put_timeout
+        with self._cond:
+            if self._closed:
+                return False
+            if not self._cond.wait_for(lambda: len(self._buffer) < self.capacity, timeout):
+                return False
+            self._buffer.append(entry)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def snapshot(self, limit):
+        """返回尚未落盘的最新日志（新的在前）和当前水位线"""
+        with self._cond:
+            pending = list(self._in_flight) + list(self._buffer)
+            watermark = self.watermark
+        pending.reverse()
+        return pending[:limit], watermark
+
+    def write_through(self, write):
+        """绕过缓冲区直接写入日志（如批量接口）
+
+        write 返回逐条结果：新日志的 id，失败的条目为异常对象。
+        """
+        with self._write_lock:
+            outcomes = write()
+            ids = [outcome for outcome in outcomes if isinstance(outcome, int)]
+            if ids:
+                with self._cond:
+                    self.watermark = max(self.watermark, max(ids))
+        return outcomes
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or len(self._buffer) >= self.batch_size,
+                    self.flush_interval
+                )
+                closed = self._closed
+            self._flush_pending()
+            if closed:
+                break
+
+    def _flush_pending(self):
+        """写入缓冲区中的全部日志"""
+        with self._write_lock:
+            while True:
+                with self._cond:
+                    count = min(len(self._buffer), self.batch_size)
+                    if not count:
+                        return
+                    self._in_flight = [self._buffer.popleft() for _ in range(count)]
+                    self._cond.notify_all()
+                    batch = self._in_flight
+                try:
+                    outcomes = self.write_batch(batch)
+                except Exception as e:
+                    # 整批写入失败时逐条写入，仍失败的条目被丢弃
+                    print(f"日志批量写入失败，改为逐条写入: {e}")
+                    outcomes = [self._write_one(entry) for entry in batch]
+                ids = [outcome for outcome in outcomes if isinstance(outcome, int)]
+                rejected = [(entry, outcome) for entry, outcome in zip(batch, outcomes)
+                            if not isinstance(outcome, int)]
+                with self._cond:
+                    self._in_flight = []
+                    if ids:
+                        self.watermark = max(self.watermark, max(ids))
+                    self.dropped += len(rejected)
+                    self.rejected.extend(entry for entry, _ in rejected)
+                if rejected:
+                    print(f"丢弃 {len(rejected)} 条无法写入的日志: {rejected[0][1]}")
+                if ids and self.on_flush is not None:
+                    self.on_flush()
+
+    def _write_one(self, entry):
+        """单独写入一条日志，返回 id 或异常"""
+        try:
+            return self.write_batch([entry])[0]
+        except Exception as e:
+            return e
+
+    def stats(self):
+        """获取缓冲区指标"""
+        with self._cond:
+            return {
+                "buffered": len(self._buffer) + len(self._in_flight),
+                "capacity": self.capacity,
+                "dropped": self.dropped,
+                "watermark": self.watermark
+            }
+
+    def flush(self):
+        """立即写入缓冲区中的全部日志"""
+        self._flush_pending()
+
+    def close(self):
+        """停止后台线程，写入剩余日志"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._flush_pending()
+
+# 日志分区表名，例如 logs_20240131
+LOG_PARTITION_PATTERN = re.compile(r'^logs_(\d{8})$')
+LOG_PARTITIONS_SQL = "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'logs_[0-9]*'"
+
+class LogRetentionManager:
+    """日志分区与保留策略
+
+    logs 表只保存当天（UTC）的日志，作为热分区；后台线程定期把更早的日志
+    按天移动到 logs_YYYYMMDD 分区表。超过 retention_days 的分区被删除，
+    设置了 archive_dir 时先复制到归档目录下的独立数据库文件，删除后
+    执行 incremental_vacuum 回收空间。
+    """
+
+    def __init__(self, database, retention_days=7, archive_dir=None, interval=300):
+        self.database = database
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        # interval 为 None 时不启动后台线程，只能手动调用 run_once
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        if interval is not None:
+            self._thread = threading.Thread(target=self._run, name="log-retention", daemon=True)
+            self._thread.start()
+
+    def partitions(self, conn):
+        """列出日志分区表，新的在前"""
+        names = [row[0] for row in conn.execute(LOG_PARTITIONS_SQL)]
+        return sorted((n for n in names if LOG_PARTITION_PATTERN.match(n)), reverse=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"日志分区维护失败: {e}")
+
+    def run_once(self, today=None):
+        """执行一次分区滚动、过期清理和空间回收"""
+        today = today or datetime.now(timezone.utc).date()
+        self.rollover(today)
+        self.expire(today)
+
+    def rollover(self, today):
+        """把热分区中早于今天的日志按天移入分区表，返回移动的行数
+
+        created_at 不是日期格式的行无法归入分区，留在热分区中。
+        """
+        boundary = today.isoformat()
+
+        def move(conn):
+            days = [row[0] for row in conn.execute(OLD_LOG_DAYS_SQL, (boundary,))]
+            moved = 0
+            for day in days:
+                if not day or not re.match(r'^\d{4}-\d{2}-\d{2}$', day):
+                    continue
+                table = "logs_" + day.replace("-", "")
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id INTEGER PRIMARY KEY,
+                        level TEXT NOT NULL,
+                        message TEXT NOT NULL,
+                        created_at TIMESTAMP
+                    )
+                ''')
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table}(created_at)")
+                day_range = (day, day + "~")
+                conn.execute(f"INSERT OR IGNORE INTO {table} {COPY_LOG_DAY_SQL}", day_range)
+                moved += conn.execute(DELETE_LOG_DAY_SQL, day_range).rowcount
+            return moved
+
+        return self.database.writer.execute(move)
+
+    def expire(self, today):
+        """删除（或归档后删除）超过保留天数的分区"""
+        cutoff = "logs_" + (today - timedelta(days=self.retention_days)).strftime('%Y%m%d')
+        with self.database.pool.connection() as conn:
+            expired = [name for name in self.partitions(conn) if name < cutoff]
+        if not expired:
+            return []
+
+        for table in expired:
+            if self.archive_dir:
+                self._archive(table)
+            self.database.writer.execute(lambda conn, table=table: conn.execute(f"DROP TABLE IF EXISTS {table}"))
+        self.database.writer.execute(lambda conn: conn.execute("PRAGMA incremental_vacuum").fetchall())
+        self.database.log_partitions_dropped(expired)
+        return expired
+
+    def _archive(self, table):
+        """把分区复制到归档目录下的独立数据库文件"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        archive = sqlite3.connect(os.path.join(self.archive_dir, f"{table}.db"))
+        try:
+            archive.execute('''
+                CREATE TABLE IF NOT EXISTS logs (
+                    id INTEGER PRIMARY KEY,
+                    level TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    created_at TIMESTAMP
+                )
+            ''')
+            with self.database.pool.connection() as conn:
+                cursor = conn.execute(f"SELECT id, level, message, created_at FROM {table}")
+                while True:
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        break
+                    archive.executemany("INSERT OR IGNORE INTO logs VALUES (?, ?, ?, ?)", rows)
+            archive.commit()
+        finally:
+            archive.close()
+
+    def close(self):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+class ChangeFeed:
+    """数据变更订阅
+
+    每个订阅者持有一个有界队列；订阅者处理不及时导致队列已满时丢弃最旧的
+    事件，并在下一条事件上标记 resync，提示客户端重新加载完整数据。
+    """
+
+    def __init__(self, max_subscribers=8, max_queue=256):
+        self.max_subscribers = max_subscribers
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._sequence = 0
+        self._closed = False
+
+    def subscribe(self):
+        """订阅变更，订阅者已满或已关闭时返回 None"""
+        with self._lock:
+            if self._closed or len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscriber = queue.Queue(self.max_queue)
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        """向所有订阅者发布事件"""
+        with self._lock:
+            self._sequence += 1
+            event = dict(event, seq=self._sequence)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    subscriber.put_nowait(dict(event, resync=True))
+                except queue.Full:
+                    pass
+
+    def close(self):
+        """通知所有订阅者结束"""
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(None)
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    subscriber.put_nowait(None)
+                except queue.Full:
+                    # 与 publish 竞争时队列又被填满；订阅者的心跳超时后会检查 closed
+                    pass
+
+class QueryCache:
+    """查询结果缓存
+
+    以 (表, 查询参数) 为键缓存已读取的行，按 LRU 淘汰，并受条目数、
+    总内存（估算值）和 TTL 限制。每个条目记录所依赖的表，写操作提交后
+    按表精确失效。
+    """
+
+    def __init__(self, version_of, max_entries=256, max_bytes=16 * 1024 * 1024, ttl=30.0):
+        self.version_of = version_of
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # 单个条目最多占用总预算的四分之一，更大的结果直接流式返回不缓存
+        self.max_entry_bytes = max_bytes // 4
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._metrics = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @staticmethod
+    def estimate_size(row):
+        """估算一行结果占用的内存"""
+        return 56 + 8 * len(row) + sum(len(v) if isinstance(v, str) else 16 for v in row)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._metrics["misses"] += 1
+                return None
+            if time.monotonic() - entry["stored_at"] > self.ttl:
+                self._remove(key)
+                self._metrics["expirations"] += 1
+                self._metrics["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._metrics["hits"] += 1
+            return entry["value"]
+
+    def put(self, key, table, version, value, size):
+        """写入缓存；读取期间表已被修改时放弃，避免缓存过期数据"""
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            if self.version_of(table) != version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {"table": table, "value": value, "size": size,
+                                  "stored_at": time.monotonic()}
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._metrics["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+
+    def invalidate(self, table):
+        """删除依赖指定表的全部条目"""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry["table"] == table]
+            for key in keys:
+                self._remove(key)
+            self._metrics["invalidations"] += len(keys)
+
+    def stats(self):
+        """获取缓存指标"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics.update({
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl
+            })
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics["hit_rate"] = metrics["hits"] / lookups if lookups else 0.0
+        return metrics
+
+class CachedStream:
+    """经过 QueryCache 的查询结果
+
+    命中时直接遍历缓存的行；未命中时遍历底层结果并同时收集，完整读完
+    且未超过单条目上限时写入缓存。提供与 RowStream 相同的 next_cursor。
+    """
+
+    def __init__(self, cache, key, table, version, stream, fields=None):
+        self.cache = cache
+        self.key = key
+        self.table = table
+        self.version = version
+        self.stream = stream
+        self.fields = fields if fields is not None else stream.fields
+        self.next_cursor = None
+
+    def __iter__(self):
+        cached = self.cache.get(self.key)
+        if cached is not None:
+            rows, self.next_cursor = cached
+            yield from rows
+            return
+
+        rows = []
+        size = 0
+        for row in self.stream:
+            if rows is not None:
+                rows.append(row)
+                size += self.cache.estimate_size(row)
+                if size > self.cache.max_entry_bytes:
+                    rows = None
+            yield row
+        self.next_cursor = getattr(self.stream, "next_cursor", None)
+        if rows is not None:
+            self.cache.put(self.key, self.table, self.version, (rows, self.next_cursor), size)
 
 class DataDatabase:
     """数据库操作类"""
 
-    def __init__(self):
-        self.db_file = "app_data.db"
-        self.init_database()
+    def __init__(self, db_file="app_data.db", pool_size=8, profile="wal",
+                 log_retention_days=7, log_archive_dir=None, log_retention_interval=300):
+        self.db_file = db_file
+        self.profile = STORAGE_PROFILES[profile] if isinstance(profile, str) else profile
+        self.pool = ConnectionPool(
+            self.db_file,
+            max_size=pool_size,
+            pragmas=self.profile.connection_pragmas()
+        )
+        self.stats = StatisticsEngine()
+        self.changes = ChangeFeed()
+        # 每张表的变更计数，用于生成 ETag；generation 区分不同进程的计数
+        self.generation = format(int(time.time() * 1000), 'x')
+        self._versions = {table: 0 for table in ("users", "tasks", "logs")}
+        self._versions_lock = threading.Lock()
+        self.cache = QueryCache(self.table_version)
+        log_watermark = self.init_database()
+        # 写连接使用自动提交模式，事务由写线程显式管理
+        self.writer = DatabaseWriter(lambda: self.pool.create_connection(isolation_level=None))
+        # 缓冲日志落盘后 id 才确定，需使日志的 ETag 和查询缓存失效
+        self.log_sink = LogSink(self._write_log_batch, watermark=log_watermark,
+                                on_flush=lambda: self._table_changed("logs"))
+        self.log_retention = LogRetentionManager(
+            self, retention_days=log_retention_days, archive_dir=log_archive_dir,
+            interval=log_retention_interval
+        )
 
     def init_database(self):
-        """初始化数据库"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-
-        # 创建用户表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                age INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # 创建任务表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                status TEXT DEFAULT 'pending',
-                priority TEXT DEFAULT 'medium',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                completed_at TIMESTAMP
-            )
-        ''')
-
-        # 创建日志表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                level TEXT NOT NULL,
-                message TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        """初始化数据库：执行结构迁移并检查查询计划"""
+        with self.pool.connection() as conn:
+            auto_vacuum = {"NONE": 0, "FULL": 1, "INCREMENTAL": 2}[self.profile.auto_vacuum]
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != auto_vacuum:
+                # 已有数据的数据库需要 VACUUM 一次才能切换 auto_vacuum 模式
+                conn.execute(f"PRAGMA auto_vacuum = {self.profile.auto_vacuum}")
+                conn.execute("VACUUM")
+            conn.execute(f"PRAGMA journal_mode = {self.profile.journal_mode}")
+            self.migrate(conn)
+            problems = self.check_query_plans(conn)
+            if problems:
+                raise RuntimeError("查询计划检查失败:\n" + "\n".join(problems))
+            self.stats.load(conn)
+            log_watermark = conn.execute(MAX_LOG_ID_SQL).fetchone()[0] or 0
+        return log_watermark
+
+    def migrate(self, conn):
+        """按版本号依次执行尚未应用的迁移"""
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            conn.execute("BEGIN")
+            try:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"数据库迁移到版本 {version}: {description}")
+
+    def shipped_queries(self):
+        """应用中使用的全部查询及示例参数，用于查询计划检查"""
+        queries = [
+            ("用户总数", USER_COUNT_SQL, ()),
+            ("任务状态统计", TASK_STATUS_COUNT_SQL, ()),
+            ("任务状态", TASK_STATUS_SQL, (1,)),
+            ("最近日志", RECENT_LOGS_SQL, (0, 50)),
+            ("日志水位线", MAX_LOG_ID_SQL, ()),
+            ("待归档日志日期", OLD_LOG_DAYS_SQL, ("",)),
+            ("复制当天日志", COPY_LOG_DAY_SQL, ("", "~")),
+            ("清理热分区", DELETE_LOG_DAY_SQL, ("", "~"))
+        ]
+        for table, fields in TABLE_FIELDS.items():
+            queries.append((f"{table} 首页", build_page_sql(table, fields, False), (DEFAULT_PAGE_SIZE,)))
+            queries.append((f"{table} 翻页", build_page_sql(table, fields, True), ("", 0, DEFAULT_PAGE_SIZE)))
+        return queries
+
+    def explain_query_plans(self, conn):
+        """返回每个查询的 EXPLAIN QUERY PLAN 结果"""
+        return [
+            (name, sql, [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)])
+            for name, sql, params in self.shipped_queries()
+        ]
 
-        conn.commit()
-        conn.close()
+    def check_query_plans(self, conn):
+        """检查查询计划，返回出现全表扫描的查询"""
+        problems = []
+        for name, sql, plan in self.explain_query_plans(conn):
+            for detail in plan:
+                if FULL_SCAN_PATTERN.match(detail):
+                    problems.append(f"{name}: {detail} ({sql})")
+        return problems
+
+    def close(self):
+        """写入缓冲日志，停止写线程并关闭连接池"""
+        self.changes.close()
+        self.log_retention.close()
+        self.log_sink.close()
+        self.writer.close()
+        self.pool.close()
 
     def add_user(self, name, email, age):
         """添加用户"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
+        def insert(conn):
+            cursor = conn.execute(
                 "INSERT INTO users (name, email, age) VALUES (?, ?, ?)",
                 (name, email, age)
             )
-            conn.commit()
-            user_id = cursor.lastrowid
+            return cursor.lastrowid
+
+        try:
+            user_id = self.writer.execute(insert)
+            self.stats.user_added()
+            self._record_change("users", "insert", ids=[user_id])
             return {"success": True, "user_id": user_id}
         except sqlite3.IntegrityError:
             return {"success": False, "error": "邮箱已存在"}
         except Exception as e:
             return {"success": False, "error": str(e)}
-        finally:
-            conn.close()
-
-    def get_users(self):
-        """获取所有用户"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users ORDER BY created_at DESC")
-        users = cursor.fetchall()
-        conn.close()
 
-        return [
-            {
-                "id": row[0],
-                "name": row[1],
-                "email": row[2],
-                "age": row[3],
-                "created_at": row[4]
-            }
-            for row in users
-        ]
+    def iter_page(self, table, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None):
+        """按 (created_at, id) 倒序做键集分页，返回逐行读取的结果（经过查询缓存）"""
+        all_fields = TABLE_FIELDS[table]
+        if fields:
+            unknown = [f for f in fields if f not in all_fields]
+            if unknown:
+                raise ValueError(f"未知字段: {', '.join(unknown)}")
+            fields = [f for f in all_fields if f in fields]
+        else:
+            fields = list(all_fields)
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        # 生成游标需要 created_at 和 id，未请求时在输出前去掉
+        columns = fields + [f for f in ("created_at", "id") if f not in fields]
+        sql = build_page_sql(table, columns, bool(cursor))
+        params = list(decode_cursor(cursor)) if cursor else []
+        params.append(limit + 1)
+        stream = RowStream(self.pool, sql, params, columns, fields, page_limit=limit)
+        key = (table, limit, cursor, tuple(fields))
+        return CachedStream(self.cache, key, table, self.table_version(table), stream)
+
+    def _fetch_page(self, table, limit, cursor, fields):
+        """读取一整页"""
+        stream = self.iter_page(table, limit, cursor, fields)
+        items = rows_to_dicts(stream.fields, stream)
+        return {"items": items, "next_cursor": stream.next_cursor}
+
+    def get_users(self, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None):
+        """分页获取用户"""
+        return self._fetch_page("users", limit, cursor, fields)
 
     def add_task(self, title, description, priority="medium"):
         """添加任务"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
+        def insert(conn):
+            cursor = conn.execute(
                 "INSERT INTO tasks (title, description, priority) VALUES (?, ?, ?)",
                 (title, description, priority)
             )
-            conn.commit()
-            task_id = cursor.lastrowid
+            return cursor.lastrowid
+
+        try:
+            task_id = self.writer.execute(insert)
+            self.stats.task_added()
+            self._record_change("tasks", "insert", ids=[task_id])
             return {"success": True, "task_id": task_id}
         except Exception as e:
             return {"success": False, "error": str(e)}
-        finally:
-            conn.close()
-
-    def get_tasks(self):
-        """获取所有任务"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM tasks ORDER BY created_at DESC")
-        tasks = cursor.fetchall()
-        conn.close()
 
-        return [
-            {
-                "id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "status": row[3],
-                "priority": row[4],
-                "created_at": row[5],
-                "completed_at": row[6]
-            }
-            for row in tasks
-        ]
+    def get_tasks(self, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None):
+        """分页获取任务"""
+        return self._fetch_page("tasks", limit, cursor, fields)
 
     def update_task_status(self, task_id, status):
         """更新任务状态"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        try:
+        def update(conn):
+            row = conn.execute(TASK_STATUS_SQL, (task_id,)).fetchone()
             if status == "completed":
-                cursor.execute(
+                conn.execute(
                     "UPDATE tasks SET status = ?, completed_at = CURRENT_TIMESTAMP WHERE id = ?",
                     (status, task_id)
                 )
             else:
-                cursor.execute(
+                conn.execute(
                     "UPDATE tasks SET status = ?, completed_at = NULL WHERE id = ?",
                     (status, task_id)
                 )
-            conn.commit()
+            return row[0] if row else None
+
+        try:
+            old_status = self.writer.execute(update)
+            if old_status is not None:
+                self.stats.task_status_changed(old_status, status)
+                self._record_change("tasks", "update", ids=[int(task_id)], status=status)
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
-        finally:
-            conn.close()
+
+    def _insert_rows(self, sql, rows):
+        """在写线程中插入多行，返回与 rows 一一对应的结果：新行 id 或异常
+
+        先在 SAVEPOINT 中用 executemany 整批插入；有行失败时回滚整批，改为
+        逐行插入。单条语句失败只回滚该语句本身，其余行不受影响。
+        """
+        def insert(conn):
+            conn.execute("SAVEPOINT bulk_insert")
+            try:
+                conn.executemany(sql, rows)
+                # AUTOINCREMENT 在同一条语句内按顺序分配 id，因此可由最后一个 id 反推
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                conn.execute("RELEASE bulk_insert")
+                return list(range(last_id - len(rows) + 1, last_id + 1))
+            except sqlite3.Error:
+                conn.execute("ROLLBACK TO bulk_insert")
+                conn.execute("RELEASE bulk_insert")
+
+            outcomes = []
+            for row in rows:
+                try:
+                    outcomes.append(conn.execute(sql, row).lastrowid)
+                except sqlite3.Error as e:
+                    outcomes.append(e)
+            return outcomes
+
+        if not rows:
+            return []
+        return self.writer.execute(insert)
+
+    def _batch_results(self, errors, rows_index, outcomes, id_key, integrity_error=None):
+        """合并校验错误和逐行插入结果，按原始顺序返回每条的结果及新行 id"""
+        results = [{"index": index, "success": False, "error": error} for index, error in errors]
+        ids = []
+        for index, outcome in zip(rows_index, outcomes):
+            if isinstance(outcome, int):
+                ids.append(outcome)
+                results.append({"index": index, "success": True, id_key: outcome})
+            else:
+                error = integrity_error if integrity_error and isinstance(outcome, sqlite3.IntegrityError) \
+                    else str(outcome)
+                results.append({"index": index, "success": False, "error": error})
+        results.sort(key=lambda r: r["index"])
+        response = {"success": True, "inserted": len(ids), "failed": len(results) - len(ids),
+                    "results": results}
+        return response, ids
+
+    def add_users_many(self, items):
+        """批量添加用户，所有有效条目在一个事务中写入
+
+        邮箱查重由唯一约束在写线程中完成，并发写入同一邮箱时只有冲突的
+        条目失败。
+        """
+        errors, rows, rows_index = [], [], []
+        seen = set()
+        for index, item in enumerate(items):
+            error = validate_item(item, BATCH_FIELD_RULES["users"])
+            if error:
+                errors.append((index, error))
+            elif item['email'] in seen:
+                errors.append((index, "邮箱重复"))
+            else:
+                seen.add(item['email'])
+                rows.append((item['name'], item['email'], item.get('age')))
+                rows_index.append(index)
+
+        try:
+            outcomes = self._insert_rows("INSERT INTO users (name, email, age) VALUES (?, ?, ?)", rows)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        response, ids = self._batch_results(errors, rows_index, outcomes, "user_id", "邮箱已存在")
+        self.stats.user_added(len(ids))
+        if ids:
+            self._record_change("users", "insert", ids=ids)
+        return response
+
+    def add_tasks_many(self, items):
+        """批量添加任务，所有有效条目在一个事务中写入"""
+        errors, rows, rows_index = [], [], []
+        for index, item in enumerate(items):
+            error = validate_item(item, BATCH_FIELD_RULES["tasks"])
+            if error:
+                errors.append((index, error))
+            else:
+                rows.append((item['title'], item.get('description'), item.get('priority') or 'medium'))
+                rows_index.append(index)
+
+        try:
+            outcomes = self._insert_rows("INSERT INTO tasks (title, description, priority) VALUES (?, ?, ?)", rows)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        response, ids = self._batch_results(errors, rows_index, outcomes, "task_id")
+        self.stats.task_added(count=len(ids))
+        if ids:
+            self._record_change("tasks", "insert", ids=ids)
+        return response
+
+    def add_logs_many(self, items):
+        """批量添加日志，所有有效条目在一个事务中写入"""
+        errors, rows, rows_index = [], [], []
+        for index, item in enumerate(items):
+            error = validate_item(item, BATCH_FIELD_RULES["logs"])
+            created_at = None
+            if not error and item.get('created_at') is not None:
+                try:
+                    created_at = normalize_timestamp(item['created_at'])
+                except ValueError:
+                    error = "created_at 不是有效的 ISO 8601 时间"
+            if error:
+                errors.append((index, error))
+            else:
+                rows.append((item.get('level') or 'info', item['message'], created_at))
+                rows_index.append(index)
+
+        try:
+            outcomes = self.log_sink.write_through(lambda: self._insert_rows(INSERT_LOGS_SQL, rows))
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        response, ids = self._batch_results(errors, rows_index, outcomes, "log_id")
+        if ids:
+            self._record_change("logs", "insert", count=len(ids))
+        return response
+
+    def get_statistics(self):
+        """获取用户和任务统计（由计数器提供，不扫描表）"""
+        return self.stats.snapshot()
+
+    def _write_log_batch(self, entries):
+        """由 LogSink 调用，批量写入缓冲的日志"""
+        rows = [entry[1:] for entry in entries]
+        return self._insert_rows(INSERT_LOGS_SQL, rows)
 
     def add_log(self, level, message):
-        """添加日志"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO logs (level, message) VALUES (?, ?)",
-            (level, message)
-        )
-        conn.commit()
-        conn.close()
+        """添加日志（异步批量写入），level 和 message 必须是非空字符串"""
+        error = validate_item({"level": level, "message": message}, LOG_ENTRY_RULES)
+        if error:
+            return {"success": False, "error": error}
+        if self.log_sink.put(level, message):
+            self._record_change("logs", "insert", count=1)
+            return {"success": True}
+        return {"success": False, "error": "日志缓冲区已满，请稍后重试"}
+
+    def iter_logs(self, limit=50):
+        """逐行读取最近日志（经过查询缓存），limit 限制在 1 到 MAX_PAGE_SIZE 之间"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        key = ("logs", limit)
+        return CachedStream(self.cache, key, "logs", self.table_version("logs"),
+                            self._iter_recent_logs(limit), fields=LOG_FIELDS)
+
+    def _iter_recent_logs(self, limit):
+        """逐行读取最近日志
+
+        缓冲日志、热分区 logs 表和各历史分区各自按 created_at 倒序取前 limit
+        行后归并。热分区中可能有批量导入的旧日期日志，不能只在热分区不足
+        limit 行时才读历史分区。历史分区按日期从新到旧读取，已有的 limit 行
+        都晚于某个分区的当天结束时，该分区及更早的分区不再读取。数据库中的
+        行全部读完、归还连接后才开始产出。
+        """
+        created_at = lambda row: row[3]
+        pending, watermark = self.log_sink.snapshot(limit)
+        with self.pool.connection() as conn:
+            # 在同一个读事务中读取热分区和历史分区，避免与分区滚动交错导致重复
+            conn.execute("BEGIN")
+            try:
+                hot = list(RowStream(self.pool, RECENT_LOGS_SQL, (watermark, limit), LOG_FIELDS, LOG_FIELDS))
+                rows = list(heapq.merge(pending, hot, key=created_at, reverse=True))[:limit]
+                for table in self.log_retention.partitions(conn):
+                    day = datetime.strptime(table[5:], '%Y%m%d').date()
+                    if len(rows) >= limit and rows[-1][3] >= (day + timedelta(days=1)).isoformat():
+                        break
+                    sql = f"SELECT * FROM {table} ORDER BY created_at DESC LIMIT ?"
+                    older = list(RowStream(self.pool, sql, (limit,), LOG_FIELDS, LOG_FIELDS))
+                    rows = list(heapq.merge(rows, older, key=created_at, reverse=True))[:limit]
+            finally:
+                conn.rollback()
+        yield from rows
 
     def get_logs(self, limit=50):
         """获取日志"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM logs ORDER BY created_at DESC LIMIT ?",
-            (limit,)
-        )
-        logs = cursor.fetchall()
-        conn.close()
+        return rows_to_dicts(LOG_FIELDS, self.iter_logs(limit))
+
+    def log_partitions_dropped(self, tables):
+        """日志分区被删除后的回调"""
+        print(f"已删除过期日志分区: {', '.join(tables)}")
+        self._record_change("logs", "expire", partitions=tables)
+
+    def table_version(self, table):
+        """获取表的变更计数"""
+        with self._versions_lock:
+            return self._versions[table]
+
+    def make_etag(self, tables, variant=""):
+        """根据表的变更计数生成 ETag，variant 区分同一接口的不同查询参数"""
+        with self._versions_lock:
+            versions = "-".join(str(self._versions[table]) for table in tables)
+        tag = f"{self.generation}-{versions}"
+        if variant:
+            tag += f"-{zlib.crc32(variant.encode('utf-8')):08x}"
+        return f'"{tag}"'
+
+    def _table_changed(self, table):
+        """更新表的变更计数并使查询缓存失效"""
+        with self._versions_lock:
+            self._versions[table] += 1
+        self.cache.invalidate(table)
+
+    def _record_change(self, table, op, **info):
+        """数据变更后更新变更计数、使查询缓存失效并通知订阅者"""
+        self._table_changed(table)
+        event = {"table": table, "op": op, "stats": self.stats.snapshot()}
+        event.update(info)
+        self.changes.publish(event)
+
+class RequestBodyError(Exception):
+    """请求体无法接受，status 为应答的 HTTP 状态码"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class RequestBody:
+    """有上限的请求体读取器
+
+    支持 Content-Length 和分块传输编码，按块读取而不一次性载入内存。
+    声明的长度超过上限时在读取前抛出 413，分块传输在累计超过上限时抛出。
+    done 表示请求体已读完，未读完的连接不能再复用。
+    """
+
+    def __init__(self, rfile, headers, read_size=64 * 1024):
+        self.rfile = rfile
+        self.read_size = read_size
+        self.max_size = None
+        self.received = 0
+        transfer_encoding = headers.get('Transfer-Encoding', '').strip().lower()
+        content_length = headers.get('Content-Length')
+        if transfer_encoding:
+            if transfer_encoding != 'chunked':
+                raise RequestBodyError(501, f"不支持的传输编码: {transfer_encoding}")
+            self.chunked = True
+            self.length = None
+            self.done = False
+        else:
+            self.chunked = False
+            try:
+                self.length = int(content_length) if content_length is not None else 0
+            except ValueError:
+                self.length = -1
+            if self.length < 0:
+                raise RequestBodyError(400, "Content-Length 无效")
+            self.done = self.length == 0
+
+    def limit(self, max_size):
+        """设置上限，已声明的长度超出时立即拒绝"""
+        self.max_size = max_size
+        if self.length is not None and self.length > max_size:
+            raise RequestBodyError(413, f"请求体超过 {max_size} 字节上限")
+
+    def _received(self, size):
+        self.received += size
+        if self.max_size is not None and self.received > self.max_size:
+            raise RequestBodyError(413, f"请求体超过 {self.max_size} 字节上限")
+
+    def iter_chunks(self):
+        """逐块产出请求体"""
+        if self.done:
+            return
+        if self.chunked:
+            yield from self._iter_chunked()
+        else:
+            remaining = self.length
+            while remaining:
+                data = self.rfile.read(min(remaining, self.read_size))
+                if not data:
+                    raise RequestBodyError(400, "请求体不完整")
+                remaining -= len(data)
+                self._received(len(data))
+                yield data
+        self.done = True
+
+    def _iter_chunked(self):
+        while True:
+            line = self.rfile.readline(1024)
+            try:
+                size = int(line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise RequestBodyError(400, "分块长度无效")
+            if size < 0:
+                raise RequestBodyError(400, "分块长度无效")
+            if size == 0:
+                # 跳过 trailer 直到空行
+                while self.rfile.readline(1024) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            self._received(size)
+            while size:
+                data = self.rfile.read(min(size, self.read_size))
+                if not data:
+                    raise RequestBodyError(400, "请求体不完整")
+                size -= len(data)
+                yield data
+            if self.rfile.readline(1024) not in (b'\r\n', b'\n'):
+                raise RequestBodyError(400, "分块格式无效")
+
+    def read(self):
+        """读取完整请求体"""
+        return b''.join(self.iter_chunks())
+
+def iter_text(chunks):
+    """把字节块增量解码为 UTF-8 文本块"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    decoder.decode(b'', final=True)
+
+class JsonValueScanner:
+    """判断缓冲区中的一个 JSON 值是否已经完整
+
+    记录括号深度和字符串/转义状态，每次只扫描新到达的文本，值完整后
+    再交给 raw_decode 解码一次，避免每补一块数据就从头重新解码。
+    """
+
+    STRUCTURE = re.compile(r'["\[\]{}]')
+    STRING_END = re.compile(r'["\\]')
+    SCALAR_END = re.compile(r'[,\]}\s]')
 
-        return [
-            {
-                "id": row[0],
-                "level": row[1],
-                "message": row[2],
-                "created_at": row[3]
-            }
-            for row in logs
-        ]
+    def __init__(self):
+        self.kind = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text, pos=0):
+        """从 pos 开始扫描 text，值已完整时返回其结束位置，否则返回 None"""
+        if self.kind is None:
+            first = text[pos]
+            if first in '[{':
+                self.kind = 'container'
+            elif first == '"':
+                self.kind = 'string'
+                self.in_string = True
+                pos += 1
+            else:
+                self.kind = 'scalar'
+        if self.kind == 'scalar':
+            # 数字等标量直到遇到分隔符才能确定没有被块边界截断
+            match = self.SCALAR_END.search(text, pos)
+            return match.start() if match else None
+        while pos < len(text):
+            if self.escape:
+                self.escape = False
+                pos += 1
+                continue
+            if self.in_string:
+                match = self.STRING_END.search(text, pos)
+                if match is None:
+                    return None
+                pos = match.end()
+                if match.group() == '\\':
+                    self.escape = True
+                else:
+                    self.in_string = False
+                    if self.kind == 'string':
+                        return pos
+                continue
+            match = self.STRUCTURE.search(text, pos)
+            if match is None:
+                return None
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                self.in_string = True
+            elif char in '[{':
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth <= 0:
+                    return pos
+        return None
+
+def iter_json_array(chunks):
+    """增量解析 JSON 数组，逐个产出元素，不保留完整请求体"""
+    decoder = json.JSONDecoder()
+    texts = iter_text(chunks)
+    buffer = ''
+    pos = 0
+
+    def skip_whitespace():
+        nonlocal buffer, pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer):
+                return
+            text = next(texts, None)
+            if text is None:
+                return
+            buffer = text
+            pos = 0
+
+    def read_value():
+        """读取从 pos 开始的一个元素，元素跨块时只拼接和解码一次"""
+        nonlocal buffer, pos
+        scanner = JsonValueScanner()
+        if scanner.feed(buffer, pos) is None:
+            parts = [buffer[pos:]]
+            for text in texts:
+                parts.append(text)
+                if scanner.feed(text) is not None:
+                    break
+            buffer = ''.join(parts)
+            pos = 0
+        value, pos = decoder.raw_decode(buffer, pos)
+        return value
+
+    skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError("请求体必须是 JSON 数组或 NDJSON")
+    pos += 1
+    skip_whitespace()
+    if pos < len(buffer) and buffer[pos] == ']':
+        pos += 1
+    else:
+        while True:
+            if pos >= len(buffer):
+                raise ValueError("JSON 数组不完整")
+            yield read_value()
+            skip_whitespace()
+            if pos >= len(buffer):
+                raise ValueError("JSON 数组不完整")
+            if buffer[pos] == ']':
+                pos += 1
+                break
+            if buffer[pos] != ',':
+                raise ValueError(f"JSON 数组中缺少逗号 (char {pos})")
+            pos += 1
+            skip_whitespace()
+    skip_whitespace()
+    if pos < len(buffer):
+        raise ValueError("JSON 数组之后有多余内容")
+
+def iter_json_lines(chunks):
+    """增量解析 NDJSON，每行一个 JSON 值
+
+    只在新到达的文本中查找换行，跨块的行先收集片段，行结束时拼接一次。
+    """
+    pending = []
+    for text in iter_text(chunks):
+        start = 0
+        while True:
+            end = text.find('\n', start)
+            if end < 0:
+                break
+            if pending:
+                pending.append(text[start:end])
+                line = ''.join(pending)
+                pending = []
+            else:
+                line = text[start:end]
+            if line.strip():
+                yield json.loads(line)
+            start = end + 1
+        if start < len(text):
+            pending.append(text[start:])
+    line = ''.join(pending)
+    if line.strip():
+        yield json.loads(line)
+
+class ChunkedWriter:
+    """HTTP/1.1 分块传输编码写入器
+
+    小块写入先合并到缓冲区，攒满 chunk_size 再作为一个分块发送。
+    chunked=False 时（HTTP/1.0 客户端）直接写出原始数据，由关闭连接表示结束。
+    """
+
+    def __init__(self, wfile, chunked=True, chunk_size=16 * 1024):
+        self.wfile = wfile
+        self.chunked = chunked
+        self.chunk_size = chunk_size
+        self._buffer = []
+        self._size = 0
+
+    def write(self, data):
+        if not data:
+            return
+        self._buffer.append(data)
+        self._size += len(data)
+        if self._size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._size:
+            return
+        data = b''.join(self._buffer)
+        self._buffer = []
+        self._size = 0
+        if self.chunked:
+            self.wfile.write(b'%X\r\n%s\r\n' % (len(data), data))
+        else:
+            self.wfile.write(data)
+
+    def close(self):
+        self.flush()
+        if self.chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+class CountingWriter:
+    """统计写出字节数的 wfile 包装"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return self.wfile.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.wfile, name)
+
+def negotiate_encoding(accept_encoding):
+    """根据 Accept-Encoding 选择压缩算法，不压缩时返回 None"""
+    supported = ["br", "gzip", "deflate"] if brotli else ["gzip", "deflate"]
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name == '*':
+            for encoding in supported:
+                weights.setdefault(encoding, q)
+        elif name in supported:
+            weights[name] = q
+
+    candidates = [e for e in supported if weights.get(e, 0) > 0]
+    if not candidates:
+        return None
+    # 权重相同时按 supported 中的顺序优先
+    return max(candidates, key=lambda e: (weights[e], -supported.index(e)))
+
+class CompressingWriter:
+    """流式压缩写入器，压缩结果写入下层的 ChunkedWriter"""
+
+    def __init__(self, writer, encoding, level=6):
+        self.writer = writer
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=min(level, 11))
+            self._compress = self._compressor.process
+            self._finish = self._compressor.finish
+        else:
+            # gzip 使用 gzip 头，HTTP 的 deflate 实际指 zlib 格式
+            wbits = 31 if encoding == "gzip" else 15
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+            self._compress = self._compressor.compress
+            self._finish = self._compressor.flush
+
+    def write(self, data):
+        self.writer.write(self._compress(data))
+
+    def close(self):
+        self.writer.write(self._finish())
+        self.writer.close()
+
+def compress_body(body, encoding, level=6):
+    """一次性压缩完整的响应体"""
+    if encoding == "br":
+        return brotli.compress(body, quality=min(level, 11))
+    wbits = 31 if encoding == "gzip" else 15
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    return compressor.compress(body) + compressor.flush()
+
+# 耗时（秒）与响应大小（字节）直方图的桶上界
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+class Histogram:
+    """固定桶直方图，输出 Prometheus 的累积桶格式"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+class RequestMetrics:
+    """按路由统计请求耗时、数据库耗时、编码耗时和响应大小
+
+    请求结束后由处理器调用 observe；render 输出 Prometheus 文本格式。
+    """
+
+    HISTOGRAMS = (
+        ("api_request_duration_seconds", "请求总耗时", "total", LATENCY_BUCKETS),
+        ("api_request_db_seconds", "请求中数据库操作耗时", "db", LATENCY_BUCKETS),
+        ("api_request_encode_seconds", "请求中序列化与压缩耗时", "encode", LATENCY_BUCKETS),
+        ("api_response_bytes", "响应写出字节数（含响应头）", "bytes", SIZE_BUCKETS),
+    )
+
+    def __init__(self, slow_request_threshold=0.5):
+        # 超过该耗时（秒）的请求写入慢请求日志，None 表示不记录
+        self.slow_request_threshold = slow_request_threshold
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._requests = {}
+        self.in_flight = 0
+        self.slow_requests = 0
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, method, route, status, samples):
+        """记录一个已完成的请求，samples 包含 total / db / encode / bytes"""
+        key = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            histograms = self._histograms.get(key)
+            if histograms is None:
+                histograms = self._histograms[key] = {
+                    sample: Histogram(buckets) for _, _, sample, buckets in self.HISTOGRAMS
+                }
+            for sample, histogram in histograms.items():
+                histogram.observe(samples[sample])
+            count_key = (method, route, status)
+            self._requests[count_key] = self._requests.get(count_key, 0) + 1
+
+    def is_slow(self, total):
+        if self.slow_request_threshold is None or total < self.slow_request_threshold:
+            return False
+        with self._lock:
+            self.slow_requests += 1
+        return True
+
+    def render(self, gauges=None):
+        """输出 Prometheus 文本格式，gauges 为附加的 {名称: (说明, 值)}"""
+        lines = []
+        with self._lock:
+            lines += ["# HELP api_requests_total 已完成的请求数", "# TYPE api_requests_total counter"]
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f'api_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+            for name, description, sample, _ in self.HISTOGRAMS:
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+                for (method, route), histograms in sorted(self._histograms.items()):
+                    lines += histograms[sample].render(name, f'method="{method}",route="{route}"')
+            lines += ["# HELP api_slow_requests_total 超过慢请求阈值的请求数",
+                      "# TYPE api_slow_requests_total counter",
+                      f"api_slow_requests_total {self.slow_requests}"]
+            gauges = dict(gauges or {})
+            gauges["api_requests_in_flight"] = ("正在处理的请求数", self.in_flight)
+        for name, (description, value) in sorted(gauges.items()):
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+class RouteNotFound(LookupError):
+    """没有匹配的路径"""
+
+class MethodNotAllowed(LookupError):
+    """路径存在但不支持该方法"""
+
+    def __init__(self, allowed):
+        super().__init__(allowed)
+        self.allowed = allowed
+
+class Route:
+    """一条路由：路径模式、各方法对应的处理方法名和 ETag 依赖的表"""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.handlers = {}
+        self.etag_tables = ()
+        self.regex = None
+        self.converters = {}
+
+class Router:
+    """声明式路由表
+
+    不含参数的路径用字典精确查找；带参数的路径（如 /api/tasks/<int:task_id>）
+    预编译为正则，按声明顺序匹配。参数类型为 int（正整数，限制在 SQLite
+    整数范围内）、str，或 a|b|c 形式的枚举。
+    """
+
+    PARAM_PATTERN = re.compile(r'<(?:([\w|]+):)?(\w+)>')
+    MAX_INT = 2 ** 63 - 1
+
+    def __init__(self, routes=()):
+        self._static = {}
+        self._dynamic = []
+        for method, pattern, handler, *etag_tables in routes:
+            self.add(method, pattern, handler, etag_tables[0] if etag_tables else None)
+
+    def add(self, method, pattern, handler, etag_tables=None):
+        """注册路由，同一路径的不同方法共享一个 Route"""
+        route = self._static.get(pattern) or next(
+            (r for r in self._dynamic if r.pattern == pattern), None)
+        if route is None:
+            route = Route(pattern)
+            if self.PARAM_PATTERN.search(pattern):
+                self._compile(route)
+                self._dynamic.append(route)
+            else:
+                self._static[pattern] = route
+        route.handlers[method] = handler
+        if etag_tables:
+            route.etag_tables = tuple(etag_tables)
+        return route
+
+    def _compile(self, route):
+        regex = ''
+        position = 0
+        for match in self.PARAM_PATTERN.finditer(route.pattern):
+            kind, name = match.group(1) or 'str', match.group(2)
+            regex += re.escape(route.pattern[position:match.start()])
+            if kind == 'int' or kind == 'str':
+                regex += f'(?P<{name}>[^/]+)'
+                route.converters[name] = kind
+            else:
+                # 枚举参数在正则中直接限定取值
+                choices = '|'.join(re.escape(choice) for choice in kind.split('|'))
+                regex += f'(?P<{name}>{choices})'
+            position = match.end()
+        regex += re.escape(route.pattern[position:])
+        route.regex = re.compile(regex + r'\Z')
+
+    def _convert(self, name, kind, value):
+        if kind == 'int':
+            if not value.isdigit() or not value.isascii() or int(value) < 1 or int(value) > self.MAX_INT:
+                raise ValueError(f"{name} 必须是正整数")
+            return int(value)
+        return value
+
+    def match(self, method, path):
+        """返回 (route, 路径参数)
+
+        找不到路径时抛出 RouteNotFound，方法不支持时抛出 MethodNotAllowed，
+        参数类型不符时抛出 ValueError。
+        """
+        route = self._static.get(path)
+        params = {}
+        if route is None:
+            for candidate in self._dynamic:
+                match = candidate.regex.match(path)
+                if match:
+                    route = candidate
+                    params = match.groupdict()
+                    break
+            else:
+                raise RouteNotFound(path)
+        if method not in route.handlers:
+            raise MethodNotAllowed(sorted(route.handlers))
+        for name, kind in route.converters.items():
+            params[name] = self._convert(name, kind, params[name])
+        return route, params
 
 class ApiRequestHandler(BaseHTTPRequestHandler):
-    """API 请求处理器"""
-
-    def __init__(self, *args, database=None, **kwargs):
+    """API 请求处理器
+
+    使用 HTTP/1.1 持久连接：空闲超过 timeout 秒或处理满
+    max_keepalive_requests 个请求后关闭连接。空闲的持久连接会占住一个
+    处理线程，因此空闲连接数受服务器的 max_idle_connections 限制（由
+    create_api_server 按并发模式设置，单线程模式为 0，即不保持连接）；
+    线程池模式下所有连接已占满工作线程时也不再保持连接。
+    """
+
+    protocol_version = "HTTP/1.1"
+    # 持久连接的空闲超时（秒）
+    timeout = 5
+    max_keepalive_requests = 100
+    # 服务器未设置时的空闲连接上限
+    max_idle_connections = 8
+
+    # 路由表：方法、路径模式、处理方法名，以及支持条件请求的只读接口依赖的表
+    router = Router([
+        ('GET', '/api/status', 'handle_status'),
+        ('GET', '/api/users', 'handle_get_users', ('users',)),
+        ('GET', '/api/tasks', 'handle_get_tasks', ('tasks',)),
+        ('GET', '/api/logs', 'handle_get_logs', ('logs',)),
+        ('GET', '/api/stats', 'handle_stats', ('users', 'tasks', 'logs')),
+        ('GET', '/api/events', 'handle_events'),
+        ('GET', '/api/cache', 'handle_cache'),
+        ('GET', '/api/metrics', 'handle_metrics'),
+        ('POST', '/api/users', 'handle_add_user'),
+        ('POST', '/api/tasks', 'handle_add_task'),
+        ('POST', '/api/logs', 'handle_add_log'),
+        ('POST', '/api/<users|tasks|logs:table>/batch', 'handle_batch'),
+        ('PUT', '/api/tasks/<int:task_id>', 'handle_update_task'),
+    ])
+
+    # 小于该字节数的完整响应不压缩
+    compression_min_size = 1024
+
+    # 请求体字节数上限，批量写入接口单独放宽
+    max_body_size = 64 * 1024
+    body_size_limits = {'handle_batch': 32 * 1024 * 1024}
+
+    # 长连接接口，耗时不计入慢请求日志
+    slow_request_exempt = frozenset({'/api/events'})
+
+    def __init__(self, *args, database=None, compression_level=6, metrics=None, **kwargs):
         self.database = database
+        self.metrics = metrics
+        # 0 表示关闭压缩
+        self.compression_level = compression_level
+        self.request_count = 0
         super().__init__(*args, **kwargs)
 
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        if self.connections is not None:
+            self.connections.set_busy(self)
+            if self.connections.draining:
+                self.close_connection = True
+        self.request_count += 1
+        # 默认输出紧凑 JSON，?pretty=1 时缩进
+        self.pretty = False
+        self.etag = None
+        self.content_encoding = None
+        if self.compression_level:
+            self.content_encoding = negotiate_encoding(self.headers.get('Accept-Encoding', ''))
+        return True
+
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+        self.connections = getattr(self.server, 'connections', None)
+        if self.connections is not None:
+            self.connections.opened(self)
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            if self.connections is not None:
+                self.connections.closed(self)
+
+    def handle_one_request(self):
+        # 服务器正在关闭时不再等待持久连接上的下一个请求
+        if self.connections is not None and not self.connections.set_idle(self):
+            self.close_connection = True
+            return
+        super().handle_one_request()
+
+    def handle_expect_100(self):
+        # 声明的长度超过所有接口的上限时不发送 100 Continue，直接拒绝
+        length = self.headers.get('Content-Length', '')
+        largest = max(self.max_body_size, *self.body_size_limits.values())
+        if length.isdigit() and int(length) > largest:
+            self.close_connection = True
+            self.send_error(413, None, f"Request body exceeds {largest} bytes")
+            return False
+        return super().handle_expect_100()
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        self.connection_header_sent = False
+        self.response_headers_pending = True
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection':
+            self.connection_header_sent = True
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        """在响应头结束时决定连接是否保持
+
+        处理器在 send_response 之后仍可能关闭连接（如 send_error、HTTP/1.0
+        的流式响应），所以到这里才决定发送 Connection: close 还是 Keep-Alive。
+        100 Continue 等中间响应不经过 send_response，不在此处理。
+        """
+        if getattr(self, 'response_headers_pending', False):
+            self.response_headers_pending = False
+            if not self.connection_header_sent:
+                if not self.close_connection and not self.can_keep_alive():
+                    self.close_connection = True
+                if self.close_connection:
+                    self.send_header('Connection', 'close')
+                else:
+                    remaining = self.max_keepalive_requests - self.request_count
+                    self.send_header('Keep-Alive', f'timeout={self.timeout}, max={remaining}')
+        super().end_headers()
+
+    def can_keep_alive(self):
+        if self.request_count >= self.max_keepalive_requests:
+            return False
+        if self.connections is None:
+            return True
+        if self.connections.draining:
+            return False
+        limit = getattr(self.server, 'max_idle_connections', self.max_idle_connections)
+        if self.connections.idle_count() >= limit:
+            return False
+        # 线程池模式：当前连接转为空闲后仍要留出一个工作线程处理新连接
+        workers = getattr(self.server, 'max_workers', None)
+        return workers is None or len(self.connections) < workers
+
     def do_GET(self):
         """处理 GET 请求"""
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        query_params = parse_qs(parsed_path.query)
-
-        if path == '/api/status':
-            self.send_json_response({
-                "status": "running",
-                "timestamp": datetime.now().isoformat(),
-                "version": "1.0.0"
-            })
-        elif path == '/api/users':
-            users = self.database.get_users()
-            self.send_json_response(users)
-        elif path == '/api/tasks':
-            tasks = self.database.get_tasks()
-            self.send_json_response(tasks)
-        elif path == '/api/logs':
-            limit = int(query_params.get('limit', [50])[0])
-            logs = self.database.get_logs(limit)
-            self.send_json_response(logs)
-        elif path == '/api/stats':
-            stats = self.get_statistics()
-            self.send_json_response(stats)
-        else:
-            self.send_error(404, "API endpoint not found")
+        self.dispatch('GET')
 
     def do_POST(self):
         """处理 POST 请求"""
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
-        data = json.loads(post_data.decode('utf-8'))
+        self.dispatch('POST')
 
+    def do_PUT(self):
+        """处理 PUT 请求"""
+        self.dispatch('PUT')
+
+    def dispatch(self, method):
+        """分发请求并记录耗时指标"""
+        self.route = None
+        self.status_code = None
+        self.timings = {"db": 0.0, "encode": 0.0}
+        if self.metrics is None:
+            self.route_request(method)
+            return
+
+        started = time.perf_counter()
+        bytes_before = self.wfile.bytes_written
+        self.metrics.request_started()
+        try:
+            self.route_request(method)
+        finally:
+            total = time.perf_counter() - started
+            route = self.route.pattern if self.route else "unmatched"
+            self.metrics.request_finished(method, route, str(self.status_code or 500), {
+                "total": total,
+                "db": self.timings["db"],
+                "encode": self.timings["encode"],
+                "bytes": self.wfile.bytes_written - bytes_before
+            })
+            if route not in self.slow_request_exempt and self.metrics.is_slow(total):
+                self.log_slow_request(method, total)
+
+    def log_slow_request(self, method, total):
+        """慢请求经 LogSink 异步写入日志表
+
+        直接放入缓冲区、不经过 add_log，因此不产生变更推送（否则每个慢请求
+        都会让页面重新加载日志）；缓冲区已满时不等待，直接放弃这条记录。
+        """
+        self.database.log_sink.put("warning", (
+            f"[慢请求] {method} {self.path} 状态 {self.status_code} 耗时 {total * 1000:.1f}ms"
+            f"（数据库 {self.timings['db'] * 1000:.1f}ms，编码 {self.timings['encode'] * 1000:.1f}ms）"
+        ), timeout=0)
+
+    @contextmanager
+    def timed(self, phase):
+        """把代码块耗时累加到当前请求的 db / encode 计时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] += time.perf_counter() - started
+
+    def route_request(self, method):
+        """按路由表分发请求
+
+        路径参数按声明的类型转换，转换失败返回 400；路径存在但方法
+        不支持时返回 405 并给出 Allow 头。
+        """
+        self.request_body = None
+        try:
+            self.request_body = RequestBody(self.rfile, self.headers)
+            self.route_to_handler(method)
+        except RequestBodyError as e:
+            # 请求体被拒绝时连接上残留未读数据，不能复用
+            self.close_connection = True
+            self.send_json_response({"success": False, "error": str(e)}, e.status)
+        finally:
+            self.discard_request_body()
+
+    def discard_request_body(self):
+        """丢弃处理器未读完的请求体（不超过上限），以便复用连接"""
+        body = self.request_body
+        if body is None:
+            self.close_connection = True
+            return
+        if body.done or self.close_connection:
+            return
+        if body.max_size is None:
+            body.max_size = self.max_body_size
+        try:
+            for _ in body.iter_chunks():
+                pass
+        except (RequestBodyError, OSError):
+            self.close_connection = True
+
+    def route_to_handler(self, method):
         parsed_path = urlparse(self.path)
-        path = parsed_path.path
+        try:
+            route, path_params = self.router.match(method, parsed_path.path)
+        except RouteNotFound:
+            self.send_error(404, "API endpoint not found")
+            return
+        except MethodNotAllowed as e:
+            self.send_json_response({"success": False, "error": f"不支持 {method} 方法"}, 405,
+                                    headers={'Allow': ', '.join(e.allowed)})
+            return
+        except ValueError as e:
+            self.send_json_response({"success": False, "error": str(e)}, 400)
+            return
+
+        self.route = route
+        handler = route.handlers[method]
+        self.request_body.limit(self.body_size_limits.get(handler, self.max_body_size))
+        self.query_params = parse_qs(parsed_path.query)
+        self.pretty = self.query_params.get('pretty', ['0'])[0] in ('1', 'true')
+
+        # 数据未变化时直接返回 304，不查询数据库也不序列化
+        if route.etag_tables:
+            self.etag = self.database.make_etag(route.etag_tables, parsed_path.query)
+            if self.content_encoding:
+                # 不同编码的响应体不同，ETag 也需区分
+                self.etag = f'{self.etag[:-1]}-{self.content_encoding}"'
+            if self.etag_matches(self.etag):
+                self.send_not_modified()
+                return
+
+        getattr(self, handler)(**path_params)
+
+    def read_json_body(self):
+        """解析 JSON 请求体，无效时返回 400 并返回 None"""
+        try:
+            data = json.loads(self.request_body.read().decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            self.send_json_response({"success": False, "error": f"请求体不是有效的 JSON: {e}"}, 400)
+            return None
+        if not isinstance(data, dict):
+            self.send_json_response({"success": False, "error": "请求体必须是 JSON 对象"}, 400)
+            return None
+        return data
+
+    def handle_status(self):
+        """服务状态"""
+        self.send_json_response({
+            "status": "running",
+            "timestamp": datetime.now().isoformat(),
+            "version": "1.0.0",
+            "database_pool": self.database.pool.stats()
+        })
+
+    def handle_get_users(self):
+        """分页获取用户"""
+        self.send_page_response('users', self.query_params)
+
+    def handle_get_tasks(self):
+        """分页获取任务"""
+        self.send_page_response('tasks', self.query_params)
+
+    def handle_get_logs(self):
+        """获取最近日志，limit 与分页接口一样限制在 MAX_PAGE_SIZE 以内"""
+        try:
+            limit = int(self.query_params.get('limit', [50])[0])
+        except ValueError:
+            self.send_json_response({"success": False, "error": "limit 必须是整数"}, 400)
+            return
+        self.send_json_stream(self.database.iter_logs(limit))
+
+    def handle_stats(self):
+        """统计信息"""
+        with self.timed("db"):
+            stats = self.get_statistics()
+        self.send_json_response(stats)
 
-        if path == '/api/users':
+    def handle_events(self):
+        """数据变更事件流
+
+        single 模式只有一个处理线程，事件流会一直占用它，因此直接拒绝，
+        页面收到错误后改为轮询。
+        """
+        if not getattr(self.server, 'event_stream_enabled', True):
+            self.send_json_response({"success": False, "error": "single 模式不支持事件流"}, 503)
+            return
+        self.send_event_stream()
+
+    def handle_cache(self):
+        """查询缓存统计"""
+        self.send_json_response(self.database.cache.stats())
+
+    def handle_metrics(self):
+        """Prometheus 文本格式的请求指标"""
+        if self.metrics is None:
+            self.send_error(404, "Metrics disabled")
+            return
+        gauges = {}
+        for prefix, stats, description in (("api_db_pool", self.database.pool.stats(), "连接池"),
+                                           ("api_query_cache", self.database.cache.stats(), "查询缓存"),
+                                           ("api_log_sink", self.database.log_sink.stats(), "日志缓冲")):
+            for name, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f"{prefix}_{name}"] = (f"{description} {name}", value)
+        body = self.metrics.render(gauges).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_add_user(self):
+        """添加用户"""
+        data = self.read_json_body()
+        if data is None:
+            return
+        with self.timed("db"):
             result = self.database.add_user(
                 data.get('name'),
                 data.get('email'),
                 data.get('age')
             )
-            self.send_json_response(result)
-        elif path == '/api/tasks':
+        self.send_json_response(result)
+
+    def handle_add_task(self):
+        """添加任务"""
+        data = self.read_json_body()
+        if data is None:
+            return
+        with self.timed("db"):
             result = self.database.add_task(
                 data.get('title'),
                 data.get('description'),
                 data.get('priority', 'medium')
             )
-            self.send_json_response(result)
-        elif path == '/api/logs':
-            self.database.add_log(
-                data.get('level', 'info'),
-                data.get('message')
-            )
-            self.send_json_response({"success": True})
-        else:
-            self.send_error(404, "API endpoint not found")
+        self.send_json_response(result)
 
-    def do_PUT(self):
-        """处理 PUT 请求"""
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
-        data = json.loads(post_data.decode('utf-8'))
+    def handle_add_log(self):
+        """添加日志"""
+        data = self.read_json_body()
+        if data is None:
+            return
+        level = data.get('level', 'info')
+        message = data.get('message')
+        error = validate_item({"level": level, "message": message}, LOG_ENTRY_RULES)
+        if error:
+            self.send_json_response({"success": False, "error": error}, 400)
+            return
+        with self.timed("db"):
+            result = self.database.add_log(level, message)
+        self.send_json_response(result, 200 if result["success"] else 503)
+
+    def handle_batch(self, table):
+        """批量写入"""
+        batch_handlers = {
+            'users': self.database.add_users_many,
+            'tasks': self.database.add_tasks_many,
+            'logs': self.database.add_logs_many
+        }
+        try:
+            items = self.parse_batch_body(self.request_body.iter_chunks())
+        except ValueError as e:
+            self.send_json_response({"success": False, "error": str(e)}, 400)
+            return
+        with self.timed("db"):
+            result = batch_handlers[table](items)
+        self.send_json_response(result)
+
+    def handle_update_task(self, task_id):
+        """更新任务状态"""
+        data = self.read_json_body()
+        if data is None:
+            return
+        with self.timed("db"):
+            result = self.database.update_task_status(task_id, data.get('status'))
+        self.send_json_response(result)
 
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
+    def parse_batch_body(self, chunks):
+        """边读边解析批量请求体：JSON 数组或 NDJSON（每行一个 JSON 对象）
 
-        if path.startswith('/api/tasks/'):
-            task_id = path.split('/')[-1]
-            result = self.database.update_task_status(
-                task_id,
-                data.get('status')
-            )
-            self.send_json_response(result)
+        条数超过 MAX_BATCH_ITEMS 时立即停止读取并返回 413。
+        """
+        content_type = self.headers.get('Content-Type', '')
+        if 'ndjson' in content_type or 'jsonlines' in content_type:
+            values = iter_json_lines(chunks)
         else:
-            self.send_error(404, "API endpoint not found")
+            values = iter_json_array(chunks)
+        items = []
+        try:
+            for item in values:
+                if len(items) >= MAX_BATCH_ITEMS:
+                    raise RequestBodyError(413, f"单次最多提交 {MAX_BATCH_ITEMS} 条")
+                items.append(item)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"请求体不是有效的 JSON: {e}")
+        finally:
+            values.close()
+        return items
+
+    def send_page_response(self, table, query_params):
+        """解析 limit / cursor / fields 参数并流式发送分页结果"""
+        try:
+            limit = int(query_params.get('limit', [DEFAULT_PAGE_SIZE])[0])
+            cursor = query_params.get('cursor', [None])[0]
+            fields = query_params.get('fields', [None])[0]
+            fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+            stream = self.database.iter_page(table, limit, cursor, fields)
+        except ValueError as e:
+            self.send_json_response({"success": False, "error": str(e)}, 400)
+            return
+        self.send_json_stream(stream, page=True)
+
+    def encode_json(self, data):
+        """按 pretty 设置编码 JSON"""
+        if self.pretty:
+            return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def etag_matches(self, etag):
+        """检查 If-None-Match 是否包含当前 ETag"""
+        header = self.headers.get('If-None-Match')
+        if not header:
+            return False
+        candidates = [tag.strip() for tag in header.split(',')]
+        return '*' in candidates or any(tag.removeprefix('W/') == etag for tag in candidates)
+
+    def send_not_modified(self):
+        """发送 304 响应"""
+        self.send_response(304)
+        self.send_validators()
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
 
-    def send_json_response(self, data, status_code=200):
+    def send_validators(self):
+        """发送 ETag，要求客户端每次使用前重新验证"""
+        if self.etag:
+            self.send_header('ETag', self.etag)
+            self.send_header('Cache-Control', 'no-cache')
+
+    def send_json_response(self, data, status_code=200, headers=None):
         """发送 JSON 响应"""
+        with self.timed("encode"):
+            body = self.encode_json(data)
+            compressed = bool(self.content_encoding) and len(body) >= self.compression_min_size
+            if compressed:
+                body = compress_body(body, self.content_encoding, self.compression_level)
         self.send_response(status_code)
         self.send_header('Content-type', 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.content_encoding:
+            self.send_header('Vary', 'Accept-Encoding')
+            if compressed:
+                self.send_header('Content-Encoding', self.content_encoding)
+        self.send_header('Content-Length', str(len(body)))
+        if status_code == 200:
+            self.send_validators()
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json_stream(self, stream, page=False):
+        """逐行编码并以分块传输发送 JSON 数组
+
+        page 为真时输出 {"items": [...], "next_cursor": ...}，游标在数组之后写出。
+        客户端支持压缩时边编码边压缩。
+        """
+        chunked = self.request_version != 'HTTP/1.0'
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_validators()
+        if self.content_encoding:
+            self.send_header('Content-Encoding', self.content_encoding)
+            self.send_header('Vary', 'Accept-Encoding')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.close_connection = True
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        response = json.dumps(data, ensure_ascii=False, indent=2)
-        self.wfile.write(response.encode('utf-8'))
+
+        writer = ChunkedWriter(self.wfile, chunked=chunked)
+        if self.content_encoding:
+            writer = CompressingWriter(writer, self.content_encoding, self.compression_level)
+        if self.pretty:
+            fields = stream.fields
+            separator = b',\n'
+            encode = lambda row: self.encode_json(dict(zip(fields, map(json_value, row))))
+        else:
+            separator = b','
+            encode = RowEncoder.for_fields(stream.fields).encode
+        rows = iter(stream)
+        # 逐行累计取数（数据库）与编码耗时，写出与压缩不计入
+        clock = time.perf_counter
+        db_time = encode_time = 0.0
+        try:
+            writer.write(b'{"items":[' if page else b'[')
+            index = 0
+            while True:
+                started = clock()
+                row = next(rows, None)
+                fetched = clock()
+                db_time += fetched - started
+                if row is None:
+                    break
+                data = encode(row)
+                encode_time += clock() - fetched
+                if index:
+                    writer.write(separator)
+                writer.write(data)
+                index += 1
+            if page:
+                writer.write(b'],"next_cursor":' + self.encode_json(stream.next_cursor) + b'}')
+            else:
+                writer.write(b']')
+            writer.close()
+        except Exception:
+            # 响应头已发出，无法再返回错误状态，只能中断连接
+            self.close_connection = True
+            raise
+        finally:
+            rows.close()
+            self.timings["db"] += db_time
+            self.timings["encode"] += encode_time
+
+    # 事件流心跳间隔（秒）：让客户端和代理知道连接仍然有效，并及时发现已断开的客户端。
+    # 等待事件时阻塞在订阅队列上而不是读套接字，不受持久连接空闲超时 timeout 约束
+    event_heartbeat = 10
+
+    def send_event_stream(self):
+        """以 Server-Sent Events 推送数据变更
+
+        连接建立后先发送一次 snapshot 事件（当前统计信息），之后每次数据变更
+        发送一条 change 事件；同一批待发送的日志事件合并为一条。
+        """
+        subscriber = self.database.changes.subscribe()
+        if subscriber is None:
+            self.send_json_response({"success": False, "error": "订阅数已达上限"}, 503)
+            return
+
+        try:
+            # 事件需要立即送达，不压缩
+            self.content_encoding = None
+            # 事件流结束时连接随之关闭
+            self.close_connection = True
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+
+            writer = ChunkedWriter(self.wfile)
+            snapshot = {"version": "1.0.0", "stats": self.database.get_statistics()}
+            writer.write(self.format_event('snapshot', snapshot))
+            writer.flush()
+
+            while True:
+                try:
+                    event = subscriber.get(timeout=self.event_heartbeat)
+                except queue.Empty:
+                    if self.database.changes.closed:
+                        writer.close()
+                        return
+                    writer.write(b': ping\n\n')
+                    writer.flush()
+                    continue
+
+                events = [event]
+                while event is not None:
+                    try:
+                        event = subscriber.get_nowait()
+                    except queue.Empty:
+                        break
+                    events.append(event)
+
+                for event in self.coalesce_events(events):
+                    if event is None:
+                        writer.close()
+                        return
+                    writer.write(self.format_event('change', event, event['seq']))
+                writer.flush()
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            self.close_connection = True
+            self.database.changes.unsubscribe(subscriber)
+
+    @staticmethod
+    def coalesce_events(events):
+        """合并连续的日志写入事件，避免高频日志刷屏"""
+        merged = []
+        for event in events:
+            previous = merged[-1] if merged else None
+            if (event is not None and previous is not None
+                    and event['table'] == previous['table'] == 'logs'
+                    and event['op'] == previous['op'] == 'insert'):
+                merged[-1] = dict(event, count=previous['count'] + event['count'],
+                                  resync=previous.get('resync') or event.get('resync', False))
+            else:
+                merged.append(event)
+        return merged
+
+    def format_event(self, name, data, event_id=None):
+        """编码一条 SSE 事件"""
+        lines = [f'event: {name}']
+        if event_id is not None:
+            lines.append(f'id: {event_id}')
+        lines.append('data: ' + json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+        return ('\n'.join(lines) + '\n\n').encode('utf-8')
 
     def get_statistics(self):
         """获取统计信息"""
-        users = self.database.get_users()
-        tasks = self.database.get_tasks()
-        logs = self.database.get_logs(10)
-
-        task_stats = {
-            "total": len(tasks),
-            "pending": len([t for t in tasks if t["status"] == "pending"]),
-            "in_progress": len([t for t in tasks if t["status"] == "in_progress"]),
-            "completed": len([t for t in tasks if t["status"] == "completed"])
-        }
+        stats = self.database.get_statistics()
+        stats["recent_logs"] = self.database.get_logs(10)
+        return stats
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """使用有界线程池处理请求的 HTTP 服务器
+
+    同时处理的请求数不超过 max_workers，排队请求数不超过 max_pending；
+    队列满时暂停 accept，由操作系统的监听队列承担背压。
+    """
+
+    def __init__(self, server_address, handler_class, max_workers=16, max_pending=64):
+        # 绑定失败时基类会调用 server_close，线程池需先创建
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api-worker")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        try:
+            future = self.executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            # 线程池已关闭
+            self._slots.release()
+            self.shutdown_request(request)
+            return
+        future.add_done_callback(lambda future: self._request_cancelled(request, future))
+
+    def _request_cancelled(self, request, future):
+        """关闭时仍在排队、未被执行的请求直接断开"""
+        if future.cancelled():
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
 
-        return {
-            "users": {
-                "total": len(users)
-            },
-            "tasks": task_stats,
-            "recent_logs": logs
-        }
+    def server_close(self):
+        # 不等待工作线程：卡住的请求不能阻塞关闭，排队中的请求被取消
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
-def run_api_server(database, port=8080):
-    """运行 API 服务器"""
-    def handler(*args, **kwargs):
-        return ApiRequestHandler(*args, database=database, **kwargs)
+class ConnectionTracker:
+    """跟踪服务器上的连接，用于优雅关闭
+
+    每个连接处于空闲（等待下一个请求）或忙碌（处理请求中）状态。drain 后
+    空闲的持久连接被立即结束读端，忙碌的连接在当前响应完成后关闭。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._connections = {}
+        self.draining = False
+
+    def opened(self, handler):
+        with self._cond:
+            self._connections[handler] = False
+
+    def closed(self, handler):
+        with self._cond:
+            self._connections.pop(handler, None)
+            self._cond.notify_all()
+
+    def set_busy(self, handler):
+        with self._cond:
+            self._connections[handler] = True
+
+    def idle_count(self):
+        """等待下一个请求的连接数"""
+        with self._cond:
+            return sum(1 for busy in self._connections.values() if not busy)
+
+    def set_idle(self, handler):
+        """连接回到空闲状态，正在关闭时返回 False 表示应断开"""
+        with self._cond:
+            self._connections[handler] = False
+            return not self.draining
+
+    def drain(self):
+        """不再复用连接，并结束所有空闲连接的读取"""
+        with self._cond:
+            self.draining = True
+            idle = [handler for handler, busy in self._connections.items() if not busy]
+        for handler in idle:
+            try:
+                handler.connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+    def close_all(self):
+        """强制断开所有连接（包括正在处理请求的），使阻塞在套接字上的处理器退出"""
+        with self._cond:
+            handlers = list(self._connections)
+        for handler in handlers:
+            try:
+                handler.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def wait_closed(self, timeout):
+        """等待所有连接关闭，超时返回 False"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._connections, timeout)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._connections)
+
+class ServerReady:
+    """服务器启动握手：绑定端口后通知等待方，绑定失败时转交异常"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.server = None
+        self.error = None
+
+    def set(self, server=None, error=None):
+        self.server = server
+        self.error = error
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """返回已绑定端口的服务器对象"""
+        if not self._event.wait(timeout):
+            raise TimeoutError("API 服务器启动超时")
+        if self.error is not None:
+            raise self.error
+        return self.server
+
+# 可选的服务器并发模式
+SERVER_MODES = ("single", "threading", "pool")
+
+def create_api_server(database, port=8080, mode="pool", max_workers=16, compression_level=6,
+                      metrics=None):
+    """按并发模式创建 API 服务器，请求指标可通过 server.metrics 访问"""
+    if metrics is None:
+        metrics = RequestMetrics()
 
-    server = HTTPServer(('localhost', port), handler)
-    print(f"API 服务器启动在 http://localhost:{port}")
+    def handler(*args, **kwargs):
+        return ApiRequestHandler(*args, database=database, compression_level=compression_level,
+                                 metrics=metrics, **kwargs)
+
+    address = ('localhost', port)
+    if mode == "single":
+        server = HTTPServer(address, handler)
+        # 单线程服务器停在空闲连接上时无法接受其他连接，不保持连接
+        server.max_idle_connections = 0
+    elif mode == "threading":
+        server = ThreadingHTTPServer(address, handler)
+        # 关闭时不等待处理线程，超时由 shutdown_api_server 控制
+        server.block_on_close = False
+    elif mode == "pool":
+        server = ThreadPoolHTTPServer(address, handler, max_workers=max_workers)
+        # 空闲连接和事件流订阅都占用工作线程，再留一个处理新连接
+        server.max_idle_connections = max(0, max_workers - database.changes.max_subscribers - 1)
+    else:
+        raise ValueError(f"未知的服务器模式: {mode}")
+    server.metrics = metrics
+    server.connections = ConnectionTracker()
+    server.event_stream_enabled = mode != "single"
+    return server
+
+def run_api_server(database, port=8080, mode="pool", max_workers=16, compression_level=6,
+                   slow_request_ms=500, ready=None):
+    """运行 API 服务器
+
+    port 为 0 时由系统分配空闲端口。传入 ServerReady 时在端口绑定后
+    通知服务器对象（含实际端口），绑定失败时转交异常。
+    """
+    metrics = RequestMetrics(slow_request_ms / 1000 if slow_request_ms else None)
+    try:
+        server = create_api_server(database, port, mode, max_workers, compression_level, metrics)
+    except Exception as e:
+        if ready is None:
+            raise
+        ready.set(error=e)
+        return
+    port = server.server_address[1]
+    print(f"API 服务器启动在 http://localhost:{port} (模式: {mode})")
+    if ready is not None:
+        ready.set(server)
     server.serve_forever()
 
+def shutdown_api_server(server, database, timeout=5.0):
+    """优雅关闭 API 服务器
+
+    停止接受新连接，结束空闲的持久连接和事件流，等待进行中的请求完成
+    （最多 timeout 秒），超时后强制断开剩余连接，再关闭监听套接字。
+    数据库由调用方随后关闭。
+    """
+    deadline = time.monotonic() + timeout
+    # 先结束空闲连接：single 模式下 serve_forever 本身可能阻塞在持久连接上
+    server.connections.drain()
+    database.changes.close()
+    # single 模式下 shutdown 要等当前请求处理完才返回，放到后台线程
+    stopper = threading.Thread(target=server.shutdown, name="api-shutdown", daemon=True)
+    stopper.start()
+    if not server.connections.wait_closed(max(deadline - time.monotonic(), 0)):
+        print(f"等待请求完成超时，强制断开剩余的 {len(server.connections)} 个连接")
+        server.connections.close_all()
+    stopper.join(max(deadline - time.monotonic(), 0.1))
+    server.server_close()
+
 class ApiServerExample:
     """API 服务器示例主类"""
 
-    def __init__(self):
-        self.database = DataDatabase()
-        self.api_port = 8080
+    def __init__(self, server_mode="pool", max_workers=16, storage_profile="wal",
+                 log_retention_days=7, log_archive_dir=None, compression_level=6,
+                 slow_request_ms=500, api_port=8080):
+        self.database = DataDatabase(
+            profile=storage_profile,
+            log_retention_days=log_retention_days,
+            log_archive_dir=log_archive_dir
+        )
+        # 0 表示由系统分配空闲端口，实际端口在服务器就绪后确定
+        self.api_port = api_port
+        self.server_mode = server_mode
+        self.max_workers = max_workers
+        self.compression_level = compression_level
+        self.slow_request_ms = slow_request_ms
 
     def create_html(self):
         """创建前端 HTML 页面"""
@@ -661,64 +3273,121 @@ class ApiServerExample:
 
     <script>
         const API_BASE = 'http://localhost:{self.api_port}/api';
+        // single 模式的服务器不提供事件流
+        const LIVE_UPDATES = {'false' if self.server_mode == 'single' else 'true'};
+        // 事件流是否在线：不在线时修改数据后由页面自己重新加载，统计信息定时轮询
+        let liveStream = false;
+        let pollTimer = null;
 
         // 页面加载时初始化
         window.addEventListener('pywebviewready', function() {{
-            checkServerStatus();
-            loadStatistics();
             loadUsers();
             loadTasks();
             loadLogs();
 
-            // 定期更新状态
-            setInterval(checkServerStatus, 5000);
-            setInterval(loadStatistics, 10000);
+            // 订阅服务器推送的数据变更，替代定时轮询
+            if (LIVE_UPDATES) {{
+                subscribeChanges();
+            }} else {{
+                startPolling();
+            }}
         }});
 
-        // 检查服务器状态
-        async function checkServerStatus() {{
-            try {{
-                const response = await fetch(`${{API_BASE}}/status`);
-                const data = await response.json();
+        // 订阅数据变更事件
+        function subscribeChanges() {{
+            const source = new EventSource(`${{API_BASE}}/events`);
+
+            source.addEventListener('snapshot', function(e) {{
+                const data = JSON.parse(e.data);
+                liveStream = true;
+                stopPolling();
+                setServerStatus(true, data.version);
+                renderStatistics(data.stats);
+            }});
+
+            source.addEventListener('change', function(e) {{
+                const change = JSON.parse(e.data);
+                renderStatistics(change.stats);
+                if (change.resync) {{
+                    loadUsers();
+                    loadTasks();
+                    loadLogs();
+                }} else if (change.table === 'users') {{
+                    loadUsers();
+                }} else if (change.table === 'tasks') {{
+                    loadTasks();
+                }} else if (change.table === 'logs') {{
+                    loadLogs();
+                }}
+            }});
+
+            // 连接断开时 EventSource 会自动重连，重连后会重新收到 snapshot；
+            // 服务器拒绝订阅（如订阅数已满）时不会重连，改为轮询
+            source.onerror = function() {{
+                liveStream = false;
+                if (source.readyState === EventSource.CLOSED) {{
+                    startPolling();
+                }} else {{
+                    setServerStatus(false);
+                }}
+            }};
+        }}
 
-                document.getElementById('serverStatus').className = 'status-indicator status-online';
-                document.getElementById('serverStatusText').textContent = `服务器在线 (版本: ${{data.version}})`;
-            }} catch (error) {{
-                document.getElementById('serverStatus').className = 'status-indicator status-offline';
-                document.getElementById('serverStatusText').textContent = '服务器离线';
+        // 没有事件流时定时轮询统计信息
+        function startPolling() {{
+            if (pollTimer) return;
+            loadStatistics();
+            pollTimer = setInterval(loadStatistics, 5000);
+        }}
+
+        function stopPolling() {{
+            if (pollTimer) {{
+                clearInterval(pollTimer);
+                pollTimer = null;
             }}
         }}
 
-        // 加载统计数据
         async function loadStatistics() {{
             try {{
                 const response = await fetch(`${{API_BASE}}/stats`);
-                const stats = await response.json();
-
-                const statsGrid = document.getElementById('statsGrid');
-                statsGrid.innerHTML = `
-                    <div class="stat-card">
-                        <div class="stat-number">${{stats.users.total}}</div>
-                        <div class="stat-label">用户总数</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-number">${{stats.tasks.total}}</div>
-                        <div class="stat-label">任务总数</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-number">${{stats.tasks.completed}}</div>
-                        <div class="stat-label">已完成任务</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-number">${{stats.tasks.pending}}</div>
-                        <div class="stat-label">待处理任务</div>
-                    </div>
-                `;
+                renderStatistics(await response.json());
+                setServerStatus(true);
             }} catch (error) {{
-                console.error('加载统计数据失败:', error);
+                setServerStatus(false);
             }}
         }}
 
+        // 显示服务器状态
+        function setServerStatus(online, version) {{
+            document.getElementById('serverStatus').className =
+                'status-indicator ' + (online ? 'status-online' : 'status-offline');
+            document.getElementById('serverStatusText').textContent =
+                !online ? '服务器离线' : version ? `服务器在线 (版本: ${{version}})` : '服务器在线';
+        }}
+
+        // 显示统计数据
+        function renderStatistics(stats) {{
+            const statsGrid = document.getElementById('statsGrid');
+            statsGrid.innerHTML = `
+                <div class="stat-card">
+                    <div class="stat-number">${{stats.users.total}}</div>
+                    <div class="stat-label">用户总数</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-number">${{stats.tasks.total}}</div>
+                    <div class="stat-label">任务总数</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-number">${{stats.tasks.completed}}</div>
+                    <div class="stat-label">已完成任务</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-number">${{stats.tasks.pending}}</div>
+                    <div class="stat-label">待处理任务</div>
+                </div>
+            `;
+        }}
+
         // 用户管理
         async function addUser() {{
             const name = document.getElementById('userName').value;
@@ -745,8 +3414,10 @@ class ApiServerExample:
                     document.getElementById('userName').value = '';
                     document.getElementById('userEmail').value = '';
                     document.getElementById('userAge').value = '';
-                    loadUsers();
-                    loadStatistics();
+                    if (!liveStream) {{
+                        loadUsers();
+                        loadStatistics();
+                    }}
                 }} else {{
                     alert('添加失败: ' + result.error);
                 }}
@@ -757,8 +3428,8 @@ class ApiServerExample:
 
         async function loadUsers() {{
             try {{
-                const response = await fetch(`${{API_BASE}}/users`);
-                const users = await response.json();
+                const response = await fetch(`${{API_BASE}}/users?limit=50`);
+                const users = (await response.json()).items;
 
                 const usersList = document.getElementById('usersList');
                 if (users.length === 0) {{
@@ -809,8 +3480,10 @@ class ApiServerExample:
                     document.getElementById('taskTitle').value = '';
                     document.getElementById('taskDescription').value = '';
                     document.getElementById('taskPriority').value = 'medium';
-                    loadTasks();
-                    loadStatistics();
+                    if (!liveStream) {{
+                        loadTasks();
+                        loadStatistics();
+                    }}
                 }} else {{
                     alert('添加失败: ' + result.error);
                 }}
@@ -821,8 +3494,8 @@ class ApiServerExample:
 
         async function loadTasks() {{
             try {{
-                const response = await fetch(`${{API_BASE}}/tasks`);
-                const tasks = await response.json();
+                const response = await fetch(`${{API_BASE}}/tasks?limit=50`);
+                const tasks = (await response.json()).items;
 
                 const tasksList = document.getElementById('tasksList');
                 if (tasks.length === 0) {{
@@ -873,11 +3546,11 @@ class ApiServerExample:
                 }});
 
                 const result = await response.json();
-                if (result.success) {{
+                if (!result.success) {{
+                    alert('更新失败: ' + result.error);
+                }} else if (!liveStream) {{
                     loadTasks();
                     loadStatistics();
-                }} else {{
-                    alert('更新失败: ' + result.error);
                 }}
             }} catch (error) {{
                 alert('更新任务状态失败: ' + error.message);
@@ -944,15 +3617,22 @@ class ApiServerExample:
     def run(self):
         """运行应用"""
         # 在后台线程启动 API 服务器
+        ready = ServerReady()
         api_server_thread = threading.Thread(
             target=run_api_server,
-            args=(self.database, self.api_port),
+            args=(self.database, self.api_port, self.server_mode, self.max_workers,
+                  self.compression_level, self.slow_request_ms, ready),
             daemon=True
         )
         api_server_thread.start()
 
-        # 等待服务器启动
-        time.sleep(2)
+        # 端口绑定后即可创建窗口，连接会在监听队列中等待 serve_forever
+        try:
+            server = ready.wait(timeout=10)
+        except Exception:
+            self.database.close()
+            raise
+        self.api_port = server.server_address[1]
 
         # 创建 WebView 窗口
         html_content = self.create_html()
@@ -977,11 +3657,64 @@ class ApiServerExample:
         print("6. 用户和任务管理")
         print("\\n按 Ctrl+C 或关闭窗口退出应用")
 
-        webview.start()
+        try:
+            webview.start()
+        finally:
+            # 窗口关闭后等待进行中的请求完成，再写入缓冲的日志
+            shutdown_api_server(server, self.database)
+            api_server_thread.join(timeout=1)
+            self.database.close()
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="PyWebView API 服务器示例")
+    parser.add_argument("--server-mode", choices=SERVER_MODES, default="pool",
+                        help="API 服务器并发模式 (默认: pool)")
+    parser.add_argument("--workers", type=int, default=16,
+                        help="pool 模式下的工作线程数 (默认: 16)")
+    parser.add_argument("--storage-profile", choices=sorted(STORAGE_PROFILES), default="wal",
+                        help="SQLite 存储配置 (默认: wal)")
+    parser.add_argument("--log-retention-days", type=int, default=7,
+                        help="日志保留天数 (默认: 7)")
+    parser.add_argument("--log-archive-dir", default=None,
+                        help="过期日志分区的归档目录，不指定则直接删除")
+    parser.add_argument("--compression-level", type=int, default=6, choices=range(0, 10),
+                        metavar="0-9", help="响应压缩级别，0 表示不压缩 (默认: 6)")
+    parser.add_argument("--port", type=int, default=8080,
+                        help="API 服务器端口，0 表示由系统分配 (默认: 8080)")
+    parser.add_argument("--slow-request-ms", type=int, default=500,
+                        help="超过该耗时的请求记录到日志表，0 表示不记录 (默认: 500)")
+    parser.add_argument("--explain", action="store_true",
+                        help="打印所有查询的执行计划后退出")
+    return parser.parse_args()
+
+def print_query_plans(database):
+    """打印所有查询的执行计划"""
+    with database.pool.connection() as conn:
+        for name, sql, plan in database.explain_query_plans(conn):
+            print(f"[{name}] {sql}")
+            for detail in plan:
+                print(f"    {detail}")
 
 def main():
     """主函数"""
-    app = ApiServerExample()
+    args = parse_args()
+    if args.explain:
+        database = DataDatabase(profile=args.storage_profile, log_retention_interval=None)
+        print_query_plans(database)
+        database.close()
+        return
+
+    app = ApiServerExample(
+        server_mode=args.server_mode,
+        max_workers=args.workers,
+        storage_profile=args.storage_profile,
+        log_retention_days=args.log_retention_days,
+        log_archive_dir=args.log_archive_dir,
+        compression_level=args.compression_level,
+        slow_request_ms=args.slow_request_ms,
+        api_port=args.port
+    )
     app.run()
 
 if __name__ == '__main__':
@@ -0,0 +1,13 @@
+"""pytest 配置
+
+示例模块在导入时 import webview，但测试只用到数据库、HTTP 服务器和
+文件管理逻辑，不创建窗口。未安装 pywebview 时注册一个空模块代替。
+"""
+
+import sys
+import types
+
+try:
+    import webview  # noqa: F401
+except ImportError:
+    sys.modules["webview"] = types.ModuleType("webview")
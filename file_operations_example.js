@@ -4,10 +4,25 @@ let currentDirectory = '';
 let selectedItems = [];
 let currentEditingFile = '';
 
+// 虚拟列表：只渲染可见区域的行，滚动时按页向后端请求数据
+const PAGE_SIZE = 200;
+const ROW_HEIGHT = 36;
+const OVERSCAN_ROWS = 10;
+let listing = null;
+let renderScheduled = false;
+let listingCounter = 0;
+let refreshTimer = null;
+// 当前搜索：关键字、目录、已加载的结果和总数
+let search = null;
+let searchRetryTimer = null;
+
 // 页面加载时初始化
 window.addEventListener('pywebviewready', function() {
     loadDirectory();
 
+    document.getElementById('fileList').addEventListener('scroll', scheduleRender);
+    window.addEventListener('resize', scheduleRender);
+
     // 点击空白处关闭右键菜单
     document.addEventListener('click', function() {
         document.getElementById('contextMenu').style.display = 'none';
@@ -19,18 +34,25 @@ window.addEventListener('pywebviewready', function() {
     });
 });
 
-// 加载目录
+// 加载目录：后台流式读取，条目分批推送到 handleBackendEvent
 async function loadDirectory(path = null) {
     updateStatus('加载目录中...');
+    cancelActiveListing();
+
+    // 先建立状态再发起请求，请求返回前到达的批次也能被接收
+    const listingId = `listing-${Date.now()}-${++listingCounter}`;
+    listing = createListing({listingId: listingId, streaming: true});
+    setupVirtualList();
+    updateItemCount(0);
+
     try {
-        const result = await pywebview.api.list_directory(path);
+        const result = await pywebview.api.start_listing(path, listingId);
+        if (!listing || listing.listingId !== listingId) return;
         if (result.success) {
             currentDirectory = result.directory;
-            displayFiles(result.items);
             updatePath(result.directory);
-            updateItemCount(result.items.length);
-            updateStatus('就绪');
         } else {
+            listing = null;
             showError(result.error);
         }
     } catch (error) {
@@ -38,33 +60,222 @@ async function loadDirectory(path = null) {
     }
 }
 
-// 显示文件列表
-function displayFiles(items) {
-    const fileList = document.getElementById('fileList');
+function createListing(options) {
+    return Object.assign({
+        listingId: null,
+        snapshotId: null,
+        streaming: false,
+        total: 0,
+        sort: document.getElementById('sortKey').value,
+        descending: document.getElementById('sortOrder').dataset.descending === 'true',
+        pages: new Map(),
+        pending: new Set()
+    }, options);
+}
 
-    if (items.length === 0) {
-        fileList.innerHTML = '<div class="loading">此文件夹为空</div>';
+// 离开目录时取消尚未完成的流式读取
+function cancelActiveListing() {
+    if (listing && listing.streaming) {
+        pywebview.api.cancel_listing(listing.listingId);
+    }
+}
+
+// 后端通过 evaluate_js 推送的事件
+function handleBackendEvent(event, payload) {
+    if (event === 'directory-changed') {
+        if (payload.directory === currentDirectory) {
+            // 连续变化合并为一次刷新
+            clearTimeout(refreshTimer);
+            refreshTimer = setTimeout(refreshListingInPlace, 300);
+        }
         return;
     }
 
-    let html = '<div class="file-grid">';
+    if (!listing || listing.listingId !== payload.listing_id) return;
+
+    if (event === 'listing-batch') {
+        appendListingItems(payload.items);
+        updateStatus(`已读取 ${payload.loaded} 个项目...`);
+    } else if (event === 'listing-done') {
+        finishListing(payload);
+    } else if (event === 'listing-error') {
+        listing = null;
+        showError(payload.error);
+    }
+}
+
+// 按到达顺序追加条目
+function appendListingItems(items) {
+    const firstBatch = listing.total === 0;
     items.forEach(item => {
-        const icon = item.is_directory ? '📁' : getFileIcon(item.extension);
-        const size = item.is_directory ? '' : formatFileSize(item.size);
+        const page = Math.floor(listing.total / PAGE_SIZE);
+        if (!listing.pages.has(page)) {
+            listing.pages.set(page, []);
+        }
+        listing.pages.get(page).push(item);
+        listing.total++;
+    });
 
-        // 为HTML属性准备安全的路径字符串
-        const pathForHtml = item.path.replace(/\\/g, '/').replace(/'/g, "\\'").replace(/"/g, '\\"');
+    if (firstBatch) {
+        setupVirtualList();
+    } else {
+        document.getElementById('virtualList').style.height = `${listing.total * ROW_HEIGHT}px`;
+        scheduleRender();
+    }
+    updateItemCount(listing.total);
+}
 
-        html += `
-            <div class="file-item" data-path="${pathForHtml}" onclick='selectItem(this, "${pathForHtml}")' ondblclick='openItem("${pathForHtml}")' oncontextmenu='showContextMenu(event, "${pathForHtml}")'>
-                <div class="file-icon">${icon}</div>
-                <div class="file-name">${item.name}</div>
-                <div class="file-size">${size}</div>
-            </div>
-        `;
+// 读取完成后切换到快照，按当前排序方式分页显示
+function finishListing(payload) {
+    if (payload.cancelled) return;
+    listing = createListing({
+        listingId: payload.listing_id,
+        snapshotId: payload.snapshot_id,
+        total: payload.total
     });
-    html += '</div>';
-    fileList.innerHTML = html;
+    setupVirtualList(true);
+    updateItemCount(payload.total);
+    updateStatus('就绪');
+}
+
+// 目录被外部修改后重新读取，保持滚动位置
+async function refreshListingInPlace() {
+    if (!listing || listing.streaming) return;
+    try {
+        const result = await pywebview.api.list_directory_page(
+            currentDirectory, 0, PAGE_SIZE, listing.sort, listing.descending, null
+        );
+        if (!listing || listing.streaming) return;
+        if (result.success) {
+            listing = createListing({
+                snapshotId: result.snapshot_id,
+                total: result.total,
+                pages: new Map([[0, result.items]])
+            });
+            setupVirtualList(true);
+            updateItemCount(result.total);
+        } else {
+            updateStatus(result.error);
+        }
+    } catch (error) {
+        updateStatus('刷新失败: ' + error.message);
+    }
+}
+
+// 建立虚拟列表容器，高度按总行数撑开
+function setupVirtualList(keepScroll = false) {
+    const fileList = document.getElementById('fileList');
+    const scrollTop = fileList.scrollTop;
+
+    if (listing.total === 0) {
+        fileList.innerHTML = listing.streaming
+            ? '<div class="loading">加载文件列表...</div>'
+            : '<div class="loading">此文件夹为空</div>';
+        return;
+    }
+
+    fileList.innerHTML = `<div class="virtual-list" id="virtualList" style="height: ${listing.total * ROW_HEIGHT}px"></div>`;
+    fileList.scrollTop = keepScroll ? scrollTop : 0;
+    renderVisibleRows();
+}
+
+function scheduleRender() {
+    if (!listing || renderScheduled) return;
+    renderScheduled = true;
+    requestAnimationFrame(function() {
+        renderScheduled = false;
+        renderVisibleRows();
+    });
+}
+
+// 只渲染可见区域（前后各多渲染 OVERSCAN_ROWS 行），缺失的页异步加载
+function renderVisibleRows() {
+    const container = document.getElementById('virtualList');
+    if (!listing || !container) return;
+
+    const fileList = document.getElementById('fileList');
+    const first = Math.max(0, Math.floor(fileList.scrollTop / ROW_HEIGHT) - OVERSCAN_ROWS);
+    const last = Math.min(listing.total, Math.ceil((fileList.scrollTop + fileList.clientHeight) / ROW_HEIGHT) + OVERSCAN_ROWS);
+
+    let html = '';
+    for (let index = first; index < last; index++) {
+        const page = Math.floor(index / PAGE_SIZE);
+        const items = listing.pages.get(page);
+        if (!items) {
+            fetchPage(page);
+            html += `<div class="file-row placeholder" style="top: ${index * ROW_HEIGHT}px">加载中...</div>`;
+            continue;
+        }
+        const item = items[index - page * PAGE_SIZE];
+        if (item) {
+            html += renderRow(item, index);
+        }
+    }
+    container.innerHTML = html;
+}
+
+// 在当前快照上请求一页数据
+async function fetchPage(page) {
+    const state = listing;
+    if (!state.snapshotId || state.pending.has(page)) return;
+    state.pending.add(page);
+    try {
+        const result = await pywebview.api.list_directory_page(
+            null, page * PAGE_SIZE, PAGE_SIZE, state.sort, state.descending, state.snapshotId
+        );
+        if (listing !== state) return;
+        if (result.success) {
+            state.pages.set(page, result.items);
+            scheduleRender();
+        } else if (result.expired) {
+            loadDirectory(currentDirectory);
+        } else {
+            showError(result.error);
+        }
+    } catch (error) {
+        showError('加载目录失败: ' + error.message);
+    } finally {
+        state.pending.delete(page);
+    }
+}
+
+// 生成一行
+function renderRow(item, index) {
+    const icon = item.is_directory ? '📁' : getFileIcon(item.extension);
+    const size = item.is_directory ? '' : formatFileSize(item.size);
+    const modified = new Date(item.modified).toLocaleString('zh-CN');
+
+    // 为HTML属性准备安全的路径字符串
+    const pathForHtml = item.path.replace(/\\/g, '/').replace(/'/g, "\\'").replace(/"/g, '\\"');
+    const selected = selectedItems.includes(pathForHtml) ? ' selected' : '';
+
+    return `
+        <div class="file-row${selected}" style="top: ${index * ROW_HEIGHT}px" data-path="${pathForHtml}" onclick='selectItem(this, "${pathForHtml}")' ondblclick='openItem("${pathForHtml}")' oncontextmenu='showContextMenu(event, "${pathForHtml}")'>
+            <span class="file-row-icon">${icon}</span>
+            <span class="file-row-name">${item.name}</span>
+            <span class="file-row-size">${size}</span>
+            <span class="file-row-modified">${modified}</span>
+        </div>
+    `;
+}
+
+// 切换排序：在同一快照上重新取数据；仍在流式读取时，完成后按新排序显示
+function changeSort() {
+    if (!listing || !listing.snapshotId) return;
+    listing = createListing({
+        listingId: listing.listingId,
+        snapshotId: listing.snapshotId,
+        total: listing.total
+    });
+    setupVirtualList();
+}
+
+function toggleSortOrder() {
+    const button = document.getElementById('sortOrder');
+    const descending = button.dataset.descending !== 'true';
+    button.dataset.descending = descending ? 'true' : 'false';
+    button.textContent = descending ? '⬇️ 降序' : '⬆️ 升序';
+    changeSort();
 }
 
 // 获取文件图标
@@ -109,7 +320,7 @@ function formatFileSize(bytes) {
 // 选择项目
 function selectItem(element, path) {
     // 清除之前的选择
-    document.querySelectorAll('.file-item').forEach(item => {
+    document.querySelectorAll('.file-item, .file-row').forEach(item => {
         item.classList.remove('selected');
     });
 
@@ -177,7 +388,7 @@ async function navigateToParent() {
     try {
         const result = await pywebview.api.navigate_to_parent();
         if (result.success) {
-            loadDirectory();
+            loadDirectory(result.directory);
         } else {
             showError(result.error);
         }
@@ -295,6 +506,7 @@ async function renameItem() {
 
 // 搜索文件
 async function searchFiles() {
+    clearTimeout(searchRetryTimer);
     const pattern = document.getElementById('searchInput').value;
     if (!pattern) {
         showError('请输入搜索关键词');
@@ -305,8 +517,20 @@ async function searchFiles() {
     try {
         const result = await pywebview.api.search_files(pattern, currentDirectory);
         if (result.success) {
-            displaySearchResults(result.results, pattern);
-            updateStatus(`找到 ${result.count} 个结果`);
+            search = {pattern, directory: result.search_path, results: result.results,
+                      total: result.total, hasMore: result.has_more};
+            displaySearchResults(search.results, pattern);
+            updateStatus(`找到 ${result.total} 个结果` + (result.indexing ? '（正在建立索引，结果不完整）' : ''));
+            if (result.indexing) {
+                // 索引建好之前定时重新搜索，期间切换了目录或换了搜索就不再继续
+                const current = search;
+                searchRetryTimer = setTimeout(() => {
+                    if (search === current && listing === null &&
+                        document.getElementById('searchInput').value === pattern) {
+                        searchFiles();
+                    }
+                }, 1000);
+            }
         } else {
             showError(result.error);
         }
@@ -315,18 +539,38 @@ async function searchFiles() {
     }
 }
 
-// 显示搜索结果
+// 按索引分页加载更多搜索结果
+async function loadMoreSearchResults() {
+    if (!search || !search.hasMore) return;
+    try {
+        const result = await pywebview.api.search_files(search.pattern, search.directory, search.results.length);
+        if (result.success) {
+            search.results = search.results.concat(result.results);
+            search.total = result.total;
+            search.hasMore = result.has_more;
+            displaySearchResults(search.results, search.pattern);
+        } else {
+            showError(result.error);
+        }
+    } catch (error) {
+        showError('加载搜索结果失败: ' + error.message);
+    }
+}
+
 function displaySearchResults(results, pattern) {
     const fileList = document.getElementById('fileList');
+    cancelActiveListing();
+    listing = null;
 
     if (results.length === 0) {
         fileList.innerHTML = `<div class="loading">没有找到包含 "${pattern}" 的文件</div>`;
         return;
     }
 
+    const total = search ? search.total : results.length;
     let html = `
         <div style="margin-bottom: 20px;">
-            <h3>搜索结果: ${results.length} 个文件</h3>
+            <h3>搜索结果: ${total} 个文件${results.length < total ? `（已显示 ${results.length} 个）` : ''}</h3>
             <button class="btn btn-secondary" onclick="loadDirectory()">返回文件列表</button>
         </div>
         <div class="file-grid">
@@ -347,6 +591,9 @@ function displaySearchResults(results, pattern) {
     });
 
     html += '</div>';
+    if (search && search.hasMore) {
+        html += '<div style="margin-top: 20px;"><button class="btn btn-secondary" onclick="loadMoreSearchResults()">加载更多</button></div>';
+    }
     fileList.innerHTML = html;
 }
 
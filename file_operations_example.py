@@ -10,18 +10,664 @@ import os
 import json
 import shutil
 import threading
+import argparse
+import tempfile
+import time
+import uuid
+import sys
+import select
+import queue
+import struct
+import ctypes
+import ctypes.util
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
+from stat import S_ISDIR
 import mimetypes
+import sqlite3
+
+# 分页列目录的排序键，目录始终排在文件之前
+LIST_SORT_KEYS = {
+    "name": lambda item: item["name"].lower(),
+    "size": lambda item: (item["size"], item["name"].lower()),
+    "mtime": lambda item: (item["modified"], item["name"].lower()),
+    "type": lambda item: (item["extension"], item["name"].lower()),
+}
+DEFAULT_PAGE_LIMIT = 200
+MAX_PAGE_LIMIT = 2000
+# 流式列目录：攒满一批或距上次推送超过间隔（秒）即推送
+STREAM_BATCH_SIZE = 500
+STREAM_FLUSH_INTERVAL = 0.1
+# 轮询监视发现不了目录内文件被修改，此时目录缓存最多使用这么多秒
+POLLING_CACHE_MAX_AGE = 2.0
+# 文件名索引：默认位置、单次返回的结果数、距上次刷新超过多少秒时在后台增量刷新，
+# 首次搜索等待建立索引的秒数，搜索前等待已排队的目录变化处理完的秒数
+DEFAULT_INDEX_FILE = os.path.join(os.path.expanduser("~"), ".cache", "pywebview-file-manager", "file_index.db")
+DEFAULT_SEARCH_LIMIT = 500
+INDEX_REFRESH_INTERVAL = 60
+INDEX_WAIT_TIMEOUT = 2.0
+INDEX_UPDATE_WAIT = 0.2
+
+class DirectoryCache:
+    """目录条目缓存
+
+    按目录保存 scan 结果，LRU 淘汰，总量受条目数和估算内存上限约束。
+    每个目录带代次号：失效时代次加一，扫描开始前记录的代次与写入时不一致
+    说明扫描期间目录已变化，结果不写入缓存。
+    设置 max_age 时条目超过该秒数即过期，用于变化通知不完整的监视方式。
+    """
+
+    def __init__(self, max_directories=64, max_bytes=32 * 1024 * 1024, max_age=None):
+        self.max_directories = max_directories
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def estimate_size(items):
+        """估算条目列表占用的内存"""
+        return sum(400 + 2 * (len(item["name"]) + len(item["path"])) for item in items)
+
+    def get(self, directory):
+        with self._lock:
+            entry = self._entries.get(directory)
+            if entry is not None and self.max_age is not None \
+                    and time.monotonic() - entry[2] > self.max_age:
+                del self._entries[directory]
+                self._bytes -= entry[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(directory)
+            self.hits += 1
+            return entry[0]
+
+    def __contains__(self, directory):
+        with self._lock:
+            return directory in self._entries
+
+    def generation(self, directory):
+        with self._lock:
+            return self._generations.get(directory, 0)
+
+    def put(self, directory, items, generation):
+        """写入缓存，返回被淘汰的目录列表（调用方据此停止监视）"""
+        size = self.estimate_size(items)
+        evicted = []
+        with self._lock:
+            if size > self.max_bytes or self._generations.get(directory, 0) != generation:
+                return [directory]
+            old = self._entries.pop(directory, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[directory] = (items, size, time.monotonic())
+            self._bytes += size
+            while len(self._entries) > self.max_directories or self._bytes > self.max_bytes:
+                evicted_directory, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                evicted.append(evicted_directory)
+        return evicted
+
+    def invalidate(self, directory=None):
+        """使目录（不指定时为全部）缓存失效"""
+        with self._lock:
+            directories = [directory] if directory is not None else list(self._entries)
+            for path in directories:
+                self._generations[path] = self._generations.get(path, 0) + 1
+                old = self._entries.pop(path, None)
+                if old is not None:
+                    self._bytes -= old[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directories": len(self._entries),
+                "bytes": self._bytes,
+                "max_directories": self.max_directories,
+                "max_bytes": self.max_bytes,
+                "max_age": self.max_age,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+class InotifyWatcher:
+    """基于 Linux inotify 的目录变化监视（通过 ctypes 调用 libc）
+
+    被监视目录内的条目增删、改名、内容或属性变化时调用 callback(directory)；
+    事件队列溢出时对所有被监视目录调用。
+    """
+
+    # 目录内文件被修改时也会收到通知
+    detects_file_changes = True
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+                  IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, callback):
+        self.callback = callback
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._rm_watch = libc.inotify_rm_watch
+        self._fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._wake_read, self._wake_write = os.pipe()
+        self._lock = threading.Lock()
+        self._paths = {}
+        self._watches = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="inotify-watcher", daemon=True)
+        self._thread.start()
+
+    def watch(self, directory):
+        """开始监视目录，失败（如超过 inotify 监视数上限）或已关闭时返回 False"""
+        with self._lock:
+            if self._closed:
+                return False
+            if directory in self._watches:
+                return True
+            wd = self._add_watch(self._fd, os.fsencode(directory), self.WATCH_MASK)
+            if wd < 0:
+                return False
+            self._watches[directory] = wd
+            self._paths[wd] = directory
+            return True
+
+    def unwatch(self, directory):
+        with self._lock:
+            wd = self._watches.pop(directory, None)
+            if wd is not None and not self._closed:
+                self._paths.pop(wd, None)
+                self._rm_watch(self._fd, wd)
+
+    def _run(self):
+        while True:
+            readable, _, _ = select.select([self._fd, self._wake_read], [], [])
+            if self._wake_read in readable:
+                return
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            changed = set()
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size + length
+                with self._lock:
+                    if mask & self.IN_Q_OVERFLOW:
+                        changed.update(self._watches)
+                        continue
+                    directory = self._paths.get(wd)
+                    if mask & self.IN_IGNORED:
+                        # 目录被删除或监视已移除
+                        if directory is not None:
+                            self._paths.pop(wd, None)
+                            self._watches.pop(directory, None)
+                if directory is not None:
+                    changed.add(directory)
+            for directory in changed:
+                self.callback(directory)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        os.write(self._wake_write, b"x")
+        self._thread.join(timeout=1)
+        for fd in (self._fd, self._wake_read, self._wake_write):
+            os.close(fd)
+
+class PollingWatcher:
+    """轮询目录自身的 stat 判断变化，不支持 inotify 时使用
+
+    只能发现条目的增删和改名（目录 mtime 变化），发现不了文件内容修改，
+    因此使用轮询时目录缓存按 POLLING_CACHE_MAX_AGE 过期。每轮每个被监视
+    目录一次 stat。
+    """
+
+    detects_file_changes = False
+
+    def __init__(self, callback, interval=2.0):
+        self.callback = callback
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._signatures = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="polling-watcher", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _signature(directory):
+        try:
+            stat = os.stat(directory)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def watch(self, directory):
+        signature = self._signature(directory)
+        if signature is None or self._stop.is_set():
+            return False
+        with self._lock:
+            self._signatures.setdefault(directory, signature)
+        return True
+
+    def unwatch(self, directory):
+        with self._lock:
+            self._signatures.pop(directory, None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                watched = list(self._signatures.items())
+            for directory, signature in watched:
+                current = self._signature(directory)
+                if current != signature:
+                    with self._lock:
+                        if directory in self._signatures:
+                            self._signatures[directory] = current
+                    self.callback(directory)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+def create_directory_watcher(callback):
+    """Linux 上使用 inotify，不可用时退回轮询"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(callback)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(callback)
+
+class FileNameIndex:
+    """持久化的文件名索引（SQLite）
+
+    files 表按目录保存文件名、大小和修改时间，另建 FTS5 trigram 表对小写
+    文件名做子串检索；少于 3 个字符的关键字无法使用 trigram，改为经 dir
+    索引取出搜索目录子树中的行逐个匹配。SQLite 不支持 trigram 时所有
+    关键字都按后一种方式匹配。
+    dirs 表记录每个已索引目录的 mtime，增量刷新时只重新读取 mtime 变化的
+    目录（新增、删除、重命名条目都会改变目录 mtime）。文件内容被修改不会
+    改变目录 mtime，这类文件的大小和修改时间要等其所在目录变化后才更新。
+
+    刷新和目录变化后的重新读取都交给一个后台线程按顺序执行，调用方通过
+    返回的 Event 等待完成。
+    """
+
+    SCHEMA_VERSION = 3
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.use_trigram = self._init_schema()
+
+        # 后台任务：键为 ("refresh", 根目录) 或 ("directory", 目录)
+        self._task_lock = threading.Lock()
+        self._queued = {}
+        self._running = None
+        self._closed = False
+        self._tasks = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="file-index", daemon=True)
+        self._worker.start()
+
+    def _init_schema(self):
+        """建表；索引只是缓存，版本不符时直接重建"""
+        with self._lock, self.conn:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                for table in ("files_fts", "files", "dirs", "roots"):
+                    self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS roots (
+                    path TEXT PRIMARY KEY,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT,
+                    mtime_ns INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_dirs_parent ON dirs(parent);
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    dir TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    folded TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_files_dir ON files(dir);
+            """)
+            try:
+                self.conn.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                        folded, content='files', content_rowid='id',
+                        tokenize='trigram case_sensitive 1'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+                        INSERT INTO files_fts(rowid, folded) VALUES (new.id, new.folded);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+                        INSERT INTO files_fts(files_fts, rowid, folded) VALUES ('delete', old.id, old.folded);
+                    END;
+                """)
+                return True
+            except sqlite3.OperationalError:
+                # 旧版 SQLite 没有 FTS5 或 trigram 分词器
+                return False
+
+    @staticmethod
+    def _upper_bound(prefix):
+        """以 prefix 开头的字符串都小于返回值（用于索引范围查询）"""
+        return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    @classmethod
+    def _subtree_clause(cls, column, root):
+        """匹配 root 自身及其子目录的 SQL 条件（范围比较，可以使用列上的索引）"""
+        prefix = root if root.endswith(os.sep) else root + os.sep
+        return (f"({column} = ? OR ({column} >= ? AND {column} < ?))",
+                [root, prefix, cls._upper_bound(prefix)])
+
+    @staticmethod
+    def _glob_pattern(pattern):
+        """把子串转成 GLOB 模式，转义 GLOB 元字符"""
+        escaped = "".join(f"[{char}]" if char in "*?[" else char for char in pattern)
+        return f"*{escaped}*"
+
+    @staticmethod
+    def _covers(root, directory):
+        prefix = root if root.endswith(os.sep) else root + os.sep
+        return directory == root or directory.startswith(prefix)
+
+    def find_root(self, directory):
+        """返回覆盖 directory 的已索引根目录，没有则返回 None"""
+        with self._lock:
+            rows = self.conn.execute("SELECT path, indexed_at FROM roots").fetchall()
+        for root, indexed_at in rows:
+            if self._covers(root, directory):
+                return root, indexed_at
+        return None
+
+    def _schedule(self, kind, path):
+        """把任务交给后台线程，同一任务还在排队时不重复加入，返回完成事件"""
+        with self._task_lock:
+            done = self._queued.get((kind, path))
+            if done is None:
+                done = self._queued[(kind, path)] = threading.Event()
+                if self._closed:
+                    done.set()
+                else:
+                    self._tasks.put((kind, path))
+            return done
+
+    def _run(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            # 开始执行前移出队列：执行期间目录再次变化会重新排队
+            with self._task_lock:
+                done = self._queued.pop(task)
+                self._running = (task, done)
+            kind, path = task
+            try:
+                if kind == "refresh":
+                    self._refresh(path)
+                else:
+                    self._update_changed(path)
+            except (OSError, sqlite3.Error) as e:
+                if not self._closed:
+                    print(f"更新文件名索引失败 {path}: {e}")
+            finally:
+                with self._task_lock:
+                    self._running = None
+                done.set()
+
+    def _pending(self, kind):
+        """排队中和执行中的任务 [(路径, 完成事件)]"""
+        with self._task_lock:
+            pending = [(path, done) for (task_kind, path), done in self._queued.items()
+                       if task_kind == kind]
+            if self._running is not None and self._running[0][0] == kind:
+                pending.append((self._running[0][1], self._running[1]))
+        return pending
+
+    def pending_refresh(self, directory):
+        """返回覆盖 directory 的未完成刷新的完成事件，没有则返回 None"""
+        for root, done in self._pending("refresh"):
+            if self._covers(root, directory):
+                return done
+        return None
+
+    def wait_for_updates(self, timeout):
+        """等待已排队的目录变化处理完，超时返回 False"""
+        deadline = time.monotonic() + timeout
+        for _, done in self._pending("directory"):
+            if not done.wait(max(0, deadline - time.monotonic())):
+                return False
+        return True
+
+    def refresh_in_background(self, root):
+        """在后台增量刷新 root，返回完成事件"""
+        return self._schedule("refresh", root)
+
+    def directory_changed(self, directory):
+        """目录内容变化：交给后台线程重新读取"""
+        return self._schedule("directory", directory)
+
+    def _refresh(self, root):
+        """增量刷新 root 下的索引，返回重新读取的目录数"""
+        seen = set()
+        rescanned = 0
+        stack = [root]
+        while stack:
+            if self._closed:
+                return rescanned
+            directory = stack.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(directory)
+            with self._lock:
+                row = self.conn.execute(
+                    "SELECT mtime_ns FROM dirs WHERE path = ?", (directory,)
+                ).fetchone()
+                if row is not None and row[0] == mtime_ns:
+                    stack.extend(path for (path,) in self.conn.execute(
+                        "SELECT path FROM dirs WHERE parent = ?", (directory,)))
+                    continue
+            subdirs = self.update_directory(directory, mtime_ns)
+            if subdirs is not None:
+                rescanned += 1
+                stack.extend(subdirs)
+
+        # 删除已不存在的目录
+        clause, params = self._subtree_clause("path", root)
+        with self._lock:
+            known = [path for (path,) in self.conn.execute(
+                f"SELECT path FROM dirs WHERE {clause}", params)]
+            with self.conn:
+                for path in known:
+                    if path not in seen:
+                        self.conn.execute("DELETE FROM files WHERE dir = ?", (path,))
+                        self.conn.execute("DELETE FROM dirs WHERE path = ?", (path,))
+                # 新根目录覆盖了原来的子根目录
+                self.conn.execute(f"DELETE FROM roots WHERE {clause}", params)
+                self.conn.execute("INSERT INTO roots (path, indexed_at) VALUES (?, ?)",
+                                  (root, time.time()))
+        return rescanned
+
+    def update_directory(self, directory, mtime_ns=None):
+        """重新读取单个目录并替换其索引，返回子目录列表；目录不可读时返回 None
+
+        不跟随指向目录的符号链接（与 os.walk 默认行为一致），避免循环。
+        """
+        files = []
+        subdirs = []
+        try:
+            if mtime_ns is None:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            files.append((directory, entry.name, entry.name.lower(),
+                                          stat.st_size, stat.st_mtime))
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM files WHERE dir = ?", (directory,))
+            self.conn.executemany(
+                "INSERT INTO files (dir, name, folded, size, mtime) VALUES (?, ?, ?, ?, ?)", files)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                (directory, os.path.dirname(directory), mtime_ns))
+        return subdirs
+
+    def _update_changed(self, directory):
+        """重新读取已索引的目录，并读入其中新出现的子目录"""
+        with self._lock:
+            indexed = self.conn.execute(
+                "SELECT 1 FROM dirs WHERE path = ?", (directory,)).fetchone()
+        if not indexed:
+            return
+        subdirs = self.update_directory(directory)
+        if subdirs is None:
+            # 目录已被删除或移走，连同子目录一起移出索引
+            self.remove_subtree(directory)
+            return
+        # 新出现的子目录（新建、复制、移动进来的）整个读入
+        stack = list(subdirs)
+        while stack and not self._closed:
+            path = stack.pop()
+            with self._lock:
+                known = self.conn.execute(
+                    "SELECT 1 FROM dirs WHERE path = ?", (path,)).fetchone()
+            if not known:
+                stack.extend(self.update_directory(path) or [])
+
+    def remove_subtree(self, directory):
+        """删除 directory 及其子目录的索引"""
+        dir_clause, dir_params = self._subtree_clause("dir", directory)
+        path_clause, path_params = self._subtree_clause("path", directory)
+        with self._lock, self.conn:
+            self.conn.execute(f"DELETE FROM files WHERE {dir_clause}", dir_params)
+            self.conn.execute(f"DELETE FROM dirs WHERE {path_clause}", path_params)
+
+    def search(self, pattern, directory, offset=0, limit=None):
+        """在 directory 子树中按小写子串搜索文件名，返回 (总数, 结果行)"""
+        folded = pattern.lower()
+        if self.use_trigram and len(folded) >= 3:
+            source = "files_fts JOIN files f ON f.id = files_fts.rowid"
+            match = "files_fts.folded GLOB ?"
+            match_params = [self._glob_pattern(folded)]
+            # 一元 + 让 dir 条件不走索引，由 FTS 驱动连接；否则会对每个目录行重新执行一次 MATCH
+            column = "+f.dir"
+        else:
+            # 少于 3 个字符无法使用 trigram：经 dir 索引只取子树中的行再逐个匹配
+            source = "files f"
+            match = "instr(f.folded, ?) > 0"
+            match_params = [folded]
+            column = "f.dir"
+        clause, params = self._subtree_clause(column, directory)
+        where = f"{match} AND {clause}"
+        with self._lock:
+            total = self.conn.execute(
+                f"SELECT count(*) FROM {source} WHERE {where}", match_params + params).fetchone()[0]
+            rows = self.conn.execute(
+                f"SELECT f.dir, f.name, f.size, f.mtime FROM {source} WHERE {where} "
+                f"ORDER BY f.dir, f.name LIMIT ? OFFSET ?",
+                match_params + params + [-1 if limit is None else limit, offset]).fetchall()
+        return total, rows
+
+    def stats(self):
+        with self._lock:
+            roots = [{"path": path, "indexed_at": datetime.fromtimestamp(indexed_at).isoformat()}
+                     for path, indexed_at in self.conn.execute("SELECT path, indexed_at FROM roots")]
+            files = self.conn.execute("SELECT count(*) FROM files").fetchone()[0]
+            dirs = self.conn.execute("SELECT count(*) FROM dirs").fetchone()[0]
+        return {"db_file": self.db_file, "trigram": self.use_trigram,
+                "roots": roots, "files": files, "directories": dirs,
+                "pending_tasks": len(self._pending("refresh")) + len(self._pending("directory"))}
+
+    def close(self):
+        """停止后台线程并关闭数据库；未完成的刷新在下次启动时重新进行"""
+        with self._task_lock:
+            self._closed = True
+            for done in self._queued.values():
+                done.set()
+        self._tasks.put(None)
+        self._worker.join(timeout=5)
+        with self._lock:
+            self.conn.close()
 
 class FileManager:
-    """文件管理器类"""
+    """文件管理器类
 
-    def __init__(self):
+    作为 js_api 暴露给页面：内部使用的方法和属性以下划线开头，页面无法调用。
+    """
+
+    def __init__(self, notify=None, index_file=DEFAULT_INDEX_FILE):
+        # notify(event, payload) 把后台事件推送到页面，属性名以下划线开头避免暴露给 js_api
+        self._notify = notify
+        self._listings = {}
+        self._listing_lock = threading.Lock()
         self.current_directory = os.getcwd()
         self.bookmarks = []
         self.recent_files = []
         self.max_recent_files = 10
+        # 分页列目录的快照：同一快照内翻页看到的是同一份条目列表
+        self._snapshots = OrderedDict()
+        self._max_snapshots = 8
+        self._snapshot_lock = threading.Lock()
+        # 目录条目缓存，由文件系统变化通知失效；监视方式发现不了文件修改时另设过期时间
+        self._watcher = create_directory_watcher(self._directory_changed)
+        self._directory_cache = DirectoryCache(
+            max_age=None if self._watcher.detects_file_changes else POLLING_CACHE_MAX_AGE)
+        # 搜索用的持久化文件名索引，第一次搜索时才打开
+        self._index_file = index_file
+        self._file_index = None
+        self._file_index_lock = threading.Lock()
 
     def get_current_directory(self):
         """获取当前目录"""
@@ -30,30 +676,30 @@ class FileManager:
             "name": os.path.basename(self.current_directory) or self.current_directory
         }
 
+    def change_directory(self, path):
+        """切换当前目录，失败时返回错误信息"""
+        if path:
+            path = os.path.abspath(path)
+            if path in self._directory_cache:
+                # 已缓存的目录被监视着，删除时缓存会失效，无需再检查
+                self.current_directory = path
+                return None
+            if not os.path.exists(path):
+                return {"success": False, "error": "路径不存在"}
+            if not os.path.isdir(path):
+                return {"success": False, "error": "不是目录"}
+            self.current_directory = path
+        return None
+
     def list_directory(self, path=None):
         """列出目录内容"""
         try:
-            if path:
-                if not os.path.exists(path):
-                    return {"success": False, "error": "路径不存在"}
-                if not os.path.isdir(path):
-                    return {"success": False, "error": "不是目录"}
-                self.current_directory = path
+            error = self.change_directory(path)
+            if error:
+                return error
 
-            items = []
             try:
-                for item in os.listdir(self.current_directory):
-                    item_path = os.path.join(self.current_directory, item)
-                    stat = os.stat(item_path)
-
-                    items.append({
-                        "name": item,
-                        "path": item_path,
-                        "is_directory": os.path.isdir(item_path),
-                        "size": stat.st_size if not os.path.isdir(item_path) else 0,
-                        "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        "extension": os.path.splitext(item)[1].lower() if not os.path.isdir(item_path) else ""
-                    })
+                items = self._scan_directory(self.current_directory)
             except PermissionError:
                 return {"success": False, "error": "没有访问权限"}
 
@@ -69,12 +715,273 @@ class FileManager:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    @staticmethod
+    def _entry_info(entry):
+        """由 os.scandir 的 DirEntry 生成条目信息
+
+        每个条目只做一次 stat（跟随符号链接，与 os.stat 一致），是否为目录
+        由同一次 stat 的结果判断。
+        """
+        stat = entry.stat()
+        is_directory = S_ISDIR(stat.st_mode)
+        return {
+            "name": entry.name,
+            "path": entry.path,
+            "is_directory": is_directory,
+            "size": 0 if is_directory else stat.st_size,
+            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "extension": "" if is_directory else os.path.splitext(entry.name)[1].lower()
+        }
+
+    @classmethod
+    def _iter_directory(cls, directory):
+        """逐个读取目录条目，stat 失败的条目（如失效的符号链接）会被跳过"""
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    yield cls._entry_info(entry)
+                except OSError:
+                    continue
+
+    @classmethod
+    def _read_directory(cls, directory):
+        """不经缓存读取目录下所有条目"""
+        return list(cls._iter_directory(directory))
+
+    def _scan_directory(self, directory):
+        """读取目录下所有条目，命中缓存时不访问文件系统"""
+        directory = os.path.abspath(directory)
+        items = self._directory_cache.get(directory)
+        if items is None:
+            generation = self._directory_cache.generation(directory)
+            # 先开始监视再读取，读取期间的变化也会使结果作废
+            watching = self._watcher.watch(directory)
+            items = self._read_directory(directory)
+            if watching:
+                self._cache_directory(directory, items, generation)
+        return list(items)
+
+    def _cache_directory(self, directory, items, generation):
+        """写入目录缓存，并停止监视被淘汰的目录"""
+        for evicted in self._directory_cache.put(directory, items, generation):
+            self._watcher.unwatch(evicted)
+
+    def _invalidate_directory(self, *paths):
+        """本程序修改文件后立即使所在目录的缓存失效（不依赖变化通知的延迟）"""
+        for path in paths:
+            path = os.path.abspath(path)
+            self._directory_cache.invalidate(path)
+            self._index_directory_changed(path)
+
+    def _directory_changed(self, directory):
+        """监视器回调：目录内容变化
+
+        先移除监视再使缓存失效：两步之间开始的读取会重新监视该目录，并因
+        缓存代数已变化而放弃写入缓存；反过来则可能留下没有监视的缓存条目。
+        """
+        self._watcher.unwatch(directory)
+        self._directory_cache.invalidate(directory)
+        self._index_directory_changed(directory)
+        if self._notify is not None:
+            self._notify("directory-changed", {"directory": directory})
+
+    def _close(self):
+        """取消后台列目录任务，停止监视线程并关闭文件名索引（窗口关闭时调用）"""
+        with self._listing_lock:
+            for cancelled in self._listings.values():
+                cancelled.set()
+        self._watcher.close()
+        with self._file_index_lock:
+            if self._file_index is not None:
+                self._file_index.close()
+                self._file_index = None
+
+    def _get_file_index(self):
+        """返回文件名索引，第一次使用时打开"""
+        with self._file_index_lock:
+            if self._file_index is None:
+                self._file_index = FileNameIndex(self._index_file)
+            return self._file_index
+
+    def _index_directory_changed(self, directory):
+        """通知已打开的索引目录有变化（在后台重新读取）"""
+        file_index = self._file_index
+        if file_index is not None:
+            file_index.directory_changed(directory)
+
+    def get_cache_stats(self):
+        """获取目录缓存统计"""
+        stats = self._directory_cache.stats()
+        stats["watcher"] = type(self._watcher).__name__
+        return {"success": True, "cache": stats}
+
+    @staticmethod
+    def _sort_items(items, sort="name", descending=False):
+        """按排序键排序，目录始终在前"""
+        ordered = sorted(items, key=LIST_SORT_KEYS[sort], reverse=descending)
+        return [item for item in ordered if item["is_directory"]] + \
+               [item for item in ordered if not item["is_directory"]]
+
+    def _create_snapshot(self, directory, items):
+        """保存目录快照，超过上限时淘汰最久未用的快照，返回 (快照 id, 快照)"""
+        snapshot_id = uuid.uuid4().hex
+        snapshot = {"directory": directory, "items": items, "orders": {}}
+        with self._snapshot_lock:
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > self._max_snapshots:
+                self._snapshots.popitem(last=False)
+        return snapshot_id, snapshot
+
+    def list_directory_page(self, path=None, offset=0, limit=DEFAULT_PAGE_LIMIT,
+                            sort="name", descending=False, snapshot_id=None):
+        """分页列出目录内容
+
+        不带 snapshot_id 时重新读取目录并生成快照；带 snapshot_id 时在该快照
+        上翻页或换排序，条目数量和顺序保持稳定。快照已被淘汰时返回
+        expired 为 True，前端应重新加载。
+        """
+        try:
+            if sort not in LIST_SORT_KEYS:
+                return {"success": False, "error": f"不支持的排序方式: {sort}"}
+            offset = max(0, int(offset))
+            limit = max(1, min(int(limit), MAX_PAGE_LIMIT))
+
+            if snapshot_id:
+                with self._snapshot_lock:
+                    snapshot = self._snapshots.get(snapshot_id)
+                    if snapshot is not None:
+                        self._snapshots.move_to_end(snapshot_id)
+                if snapshot is None:
+                    return {"success": False, "error": "目录快照已过期，请刷新", "expired": True}
+            else:
+                error = self.change_directory(path)
+                if error:
+                    return error
+                try:
+                    items = self._scan_directory(self.current_directory)
+                except PermissionError:
+                    return {"success": False, "error": "没有访问权限"}
+                snapshot_id, snapshot = self._create_snapshot(self.current_directory, items)
+
+            # 每种排序只排一次，之后的翻页直接切片
+            order_key = (sort, bool(descending))
+            ordered = snapshot["orders"].get(order_key)
+            if ordered is None:
+                ordered = snapshot["orders"].setdefault(
+                    order_key, self._sort_items(snapshot["items"], sort, bool(descending)))
+
+            total = len(ordered)
+            return {
+                "success": True,
+                "directory": snapshot["directory"],
+                "snapshot_id": snapshot_id,
+                "total": total,
+                "offset": offset,
+                "limit": limit,
+                "sort": sort,
+                "descending": bool(descending),
+                "has_more": offset + limit < total,
+                "items": ordered[offset:offset + limit]
+            }
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def start_listing(self, path=None, listing_id=None, batch_size=STREAM_BATCH_SIZE):
+        """在后台线程流式列出目录
+
+        条目按发现顺序分批以 listing-batch 事件推送，结束时推送 listing-done
+        （包含可用于 list_directory_page 的 snapshot_id）。开始新的列目录会
+        取消尚未完成的旧任务。listing_id 可由前端生成，以便在本方法返回前
+        到达的事件也能被识别。
+        """
+        try:
+            if self._notify is None:
+                return {"success": False, "error": "当前窗口不支持推送"}
+            error = self.change_directory(path)
+            if error:
+                return error
+
+            listing_id = listing_id or uuid.uuid4().hex
+            cancelled = threading.Event()
+            with self._listing_lock:
+                for previous in self._listings.values():
+                    previous.set()
+                self._listings[listing_id] = cancelled
+
+            worker = threading.Thread(
+                target=self._run_listing,
+                args=(listing_id, os.path.abspath(self.current_directory), max(1, int(batch_size)), cancelled),
+                name=f"listing-{listing_id[:8]}",
+                daemon=True
+            )
+            worker.start()
+            return {"success": True, "listing_id": listing_id, "directory": self.current_directory}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def cancel_listing(self, listing_id):
+        """取消流式列目录（如用户已离开该目录）"""
+        with self._listing_lock:
+            cancelled = self._listings.get(listing_id)
+        if cancelled is None:
+            return {"success": False, "error": "列目录任务不存在或已结束"}
+        cancelled.set()
+        return {"success": True}
+
+    def _run_listing(self, listing_id, directory, batch_size, cancelled):
+        """后台线程：逐个读取条目并分批推送"""
+        started = time.monotonic()
+        items = []
+        batch = []
+        last_push = started
+        cached = self._directory_cache.get(directory)
+        generation = self._directory_cache.generation(directory)
+        watching = cached is None and self._watcher.watch(directory)
+
+        def push(event, **payload):
+            self._notify(event, dict(payload, listing_id=listing_id, directory=directory))
+
+        try:
+            source = cached if cached is not None else self._iter_directory(directory)
+            for item in source:
+                if cancelled.is_set():
+                    break
+                items.append(item)
+                batch.append(item)
+                now = time.monotonic()
+                if len(batch) >= batch_size or now - last_push >= STREAM_FLUSH_INTERVAL:
+                    push("listing-batch", items=batch, loaded=len(items))
+                    batch = []
+                    last_push = now
+            if cached is None and hasattr(source, "close"):
+                source.close()
+
+            if cancelled.is_set():
+                push("listing-done", cancelled=True, total=len(items))
+                return
+            if batch:
+                push("listing-batch", items=batch, loaded=len(items))
+            if watching:
+                self._cache_directory(directory, items, generation)
+            snapshot_id, _ = self._create_snapshot(directory, items)
+            push("listing-done", cancelled=False, total=len(items), snapshot_id=snapshot_id,
+                 elapsed=round(time.monotonic() - started, 3))
+        except PermissionError:
+            push("listing-error", error="没有访问权限")
+        except Exception as e:
+            push("listing-error", error=str(e))
+        finally:
+            with self._listing_lock:
+                self._listings.pop(listing_id, None)
+
     def navigate_to_parent(self):
-        """导航到父目录"""
+        """切换到父目录，只返回新的当前目录，条目由 start_listing / list_directory_page 获取"""
         parent = os.path.dirname(self.current_directory)
         if parent and parent != self.current_directory:
-            return self.list_directory(parent)
-        return self.list_directory()
+            error = self.change_directory(parent)
+            if error:
+                return error
+        return {"success": True, "directory": self.current_directory}
 
     def create_directory(self, name):
         """创建目录"""
@@ -84,6 +991,7 @@ class FileManager:
                 return {"success": False, "error": "目录已存在"}
 
             os.makedirs(new_dir_path)
+            self._invalidate_directory(self.current_directory)
             return {"success": True, "message": f"目录 '{name}' 创建成功"}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -98,6 +1006,7 @@ class FileManager:
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(content)
 
+            self._invalidate_directory(self.current_directory)
             self.add_to_recent_files(file_path)
             return {"success": True, "message": f"文件 '{name}' 创建成功"}
         except Exception as e:
@@ -159,6 +1068,7 @@ class FileManager:
             with open(path, 'w', encoding='utf-8') as f:
                 f.write(content)
 
+            self._invalidate_directory(os.path.dirname(path))
             self.add_to_recent_files(path)
             return {"success": True, "message": "文件保存成功"}
         except Exception as e:
@@ -172,9 +1082,11 @@ class FileManager:
 
             if os.path.isfile(path):
                 os.remove(path)
+                self._invalidate_directory(os.path.dirname(path))
                 return {"success": True, "message": "文件删除成功"}
             elif os.path.isdir(path):
                 shutil.rmtree(path)
+                self._invalidate_directory(os.path.dirname(path), path)
                 return {"success": True, "message": "目录删除成功"}
             else:
                 return {"success": False, "error": "未知的文件类型"}
@@ -193,6 +1105,7 @@ class FileManager:
                 return {"success": False, "error": "目标名称已存在"}
 
             os.rename(old_path, new_path)
+            self._invalidate_directory(os.path.dirname(old_path), old_path)
             return {"success": True, "message": "重命名成功"}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -225,6 +1138,7 @@ class FileManager:
             else:
                 shutil.copytree(source_path, destination_path)
 
+            self._invalidate_directory(destination_dir)
             return {"success": True, "message": f"复制成功到: {destination_path}"}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -253,6 +1167,7 @@ class FileManager:
                 counter += 1
 
             shutil.move(source_path, destination_path)
+            self._invalidate_directory(os.path.dirname(source_path), source_path, destination_dir)
             return {"success": True, "message": f"移动成功到: {destination_path}"}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -279,48 +1194,63 @@ class FileManager:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
-    def search_files(self, pattern, search_path=None):
-        """搜索文件"""
-        try:
-            if search_path:
-                search_dir = search_path
-            else:
-                search_dir = self.current_directory
+    def search_files(self, pattern, search_path=None, offset=0, limit=DEFAULT_SEARCH_LIMIT):
+        """在文件名索引中搜索文件（不区分大小写）
 
-            if not os.path.exists(search_dir):
+        搜索目录首次搜索时在后台建立索引并最多等待 INDEX_WAIT_TIMEOUT 秒，
+        仍未完成时返回已索引部分并带 indexing=True，页面稍后重新搜索；
+        超过 INDEX_REFRESH_INTERVAL 秒的索引在后台增量刷新，本次直接返回
+        现有索引中的结果。
+        """
+        try:
+            search_dir = os.path.abspath(search_path or self.current_directory)
+            if not os.path.isdir(search_dir):
                 return {"success": False, "error": "搜索路径不存在"}
+            if not pattern:
+                return {"success": False, "error": "搜索关键字不能为空"}
+            offset = max(int(offset), 0)
+            limit = max(int(limit), 1)
 
-            results = []
-            pattern = pattern.lower()
-
-            for root, dirs, files in os.walk(search_dir):
-                # 限制搜索深度和结果数量
-                if len(results) > 100:
-                    break
+            file_index = self._get_file_index()
+            indexed = file_index.find_root(search_dir)
+            if indexed is None:
+                building = (file_index.pending_refresh(search_dir)
+                            or file_index.refresh_in_background(search_dir))
+                building.wait(INDEX_WAIT_TIMEOUT)
+                indexed = file_index.find_root(search_dir)
+            elif time.time() - indexed[1] > INDEX_REFRESH_INTERVAL:
+                file_index.refresh_in_background(indexed[0])
+            file_index.wait_for_updates(INDEX_UPDATE_WAIT)
 
-                for file in files:
-                    if pattern in file.lower():
-                        file_path = os.path.join(root, file)
-                        try:
-                            stat = os.stat(file_path)
-                            results.append({
-                                "name": file,
-                                "path": file_path,
-                                "size": stat.st_size,
-                                "modified": datetime.fromtimestamp(stat.st_mtime).isoformat()
-                            })
-                        except:
-                            continue
+            total, rows = file_index.search(pattern, search_dir, offset, limit)
+            results = [{
+                "name": name,
+                "path": os.path.join(directory, name),
+                "size": size,
+                "modified": datetime.fromtimestamp(mtime).isoformat()
+            } for directory, name, size, mtime in rows]
 
             return {
                 "success": True,
                 "results": results,
                 "count": len(results),
-                "search_path": search_dir
+                "total": total,
+                "offset": offset,
+                "has_more": offset + len(results) < total,
+                "search_path": search_dir,
+                # 索引尚未建完，结果不完整
+                "indexing": indexed is None
             }
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def get_index_stats(self):
+        """获取文件名索引统计"""
+        try:
+            return {"success": True, "index": self._get_file_index().stats()}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
     def add_to_recent_files(self, file_path):
         """添加到最近文件列表"""
         if file_path in self.recent_files:
@@ -378,13 +1308,24 @@ class FileManager:
 class FileOperationsExample:
     """文件操作示例主类"""
 
-    def __init__(self):
-        self.file_manager = FileManager()
+    def __init__(self, index_file=DEFAULT_INDEX_FILE):
+        self.window = None
+        self.file_manager = FileManager(notify=self.notify_window, index_file=index_file)
+
+    def notify_window(self, event, payload):
+        """把后台事件推送到页面的 handleBackendEvent"""
+        if self.window is None:
+            return
+        try:
+            self.window.evaluate_js(f"handleBackendEvent({json.dumps(event)}, {json.dumps(payload)})")
+        except Exception as e:
+            # 窗口已关闭等情况下丢弃事件
+            print(f"推送事件失败: {e}")
 
     def run(self):
         """运行应用"""
         # 使用外部 HTML 文件
-        window = webview.create_window(
+        self.window = webview.create_window(
             'PyWebView 文件管理器',
             'file_operations_example.html',
             width=1200,
@@ -411,11 +1352,127 @@ class FileOperationsExample:
         print("- F2: 重命名选中项目")
         print("\\n按 Ctrl+C 或关闭窗口退出应用")
 
-        webview.start(debug=True)
+        try:
+            webview.start(debug=True)
+        finally:
+            self.file_manager._close()
+
+def list_directory_legacy(directory):
+    """旧的 listdir + stat + isdir 实现，仅用于基准测试对比"""
+    items = []
+    for item in os.listdir(directory):
+        item_path = os.path.join(directory, item)
+        stat = os.stat(item_path)
+        items.append({
+            "name": item,
+            "path": item_path,
+            "is_directory": os.path.isdir(item_path),
+            "size": stat.st_size if not os.path.isdir(item_path) else 0,
+            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "extension": os.path.splitext(item)[1].lower() if not os.path.isdir(item_path) else ""
+        })
+    return items
+
+class _CountingEntry:
+    """统计 DirEntry.stat() 实际触发系统调用的次数（DirEntry 会缓存结果）"""
+
+    def __init__(self, entry, counts):
+        self._entry = entry
+        self._counts = counts
+        self._stat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._counts["stat"] += 1
+            self._stat = self._entry.stat()
+        return self._stat
+
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+
+def count_filesystem_calls(func, directory):
+    """统计 func 列目录时发起的文件系统调用次数（listdir / scandir / stat）"""
+    counts = {"listdir": 0, "scandir": 0, "stat": 0}
+    original_listdir, original_scandir, original_stat = os.listdir, os.scandir, os.stat
+
+    def counting_listdir(*args, **kwargs):
+        counts["listdir"] += 1
+        return original_listdir(*args, **kwargs)
+
+    def counting_stat(*args, **kwargs):
+        # os.path.isdir 内部同样调用 os.stat
+        counts["stat"] += 1
+        return original_stat(*args, **kwargs)
+
+    class CountingScandir:
+        def __init__(self, path):
+            counts["scandir"] += 1
+            self._iterator = original_scandir(path)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            self._iterator.close()
+
+        def __iter__(self):
+            return (_CountingEntry(entry, counts) for entry in self._iterator)
+
+    os.listdir, os.scandir, os.stat = counting_listdir, CountingScandir, counting_stat
+    try:
+        func(directory)
+    finally:
+        os.listdir, os.scandir, os.stat = original_listdir, original_scandir, original_stat
+    return counts
+
+def benchmark_list_directory(sizes=(1000, 10000, 100000), repeat=3):
+    """在临时目录中生成合成文件树，对比新旧列目录实现的系统调用数和耗时"""
+    implementations = (("listdir+stat", list_directory_legacy), ("scandir", FileManager._read_directory))
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="fm_bench_") as directory:
+            # 每 20 个条目中有 1 个子目录
+            for index in range(size):
+                path = os.path.join(directory, f"item_{index:06d}")
+                if index % 20 == 0:
+                    os.mkdir(path)
+                else:
+                    with open(path + ".txt", "wb") as f:
+                        f.write(b"x" * (index % 512))
+
+            print(f"\n{size} 个条目:")
+            results = []
+            for name, func in implementations:
+                best = None
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    items = func(directory)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                counts = count_filesystem_calls(func, directory)
+                results.append(sorted(items, key=lambda item: item["name"]))
+                calls = ", ".join(f"{key}={value}" for key, value in counts.items() if value)
+                print(f"  {name:<14} {best * 1000:9.1f} ms   {sum(counts.values()):7d} 次调用 ({calls})")
+            print("  结果一致" if results[0] == results[1] else "  结果不一致!")
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="PyWebView 文件管理器示例")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="运行列目录基准测试后退出")
+    parser.add_argument("--benchmark-sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        metavar="N", help="基准测试的目录条目数 (默认: 1000 10000 100000)")
+    parser.add_argument("--index-file", default=DEFAULT_INDEX_FILE,
+                        help=f"文件名索引数据库路径 (默认: {DEFAULT_INDEX_FILE})")
+    return parser.parse_args()
 
 def main():
     """主函数"""
-    app = FileOperationsExample()
+    args = parse_args()
+    if args.benchmark:
+        benchmark_list_directory(args.benchmark_sizes)
+        return
+
+    app = FileOperationsExample(index_file=args.index_file)
     app.run()
 
 if __name__ == '__main__':
@@ -0,0 +1,1082 @@
+"""api_server_example 的单元测试
+
+运行: python -m pytest test_api_server_example.py
+"""
+
+import gzip
+import http.client
+import io
+import json
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date
+
+import pytest
+
+import api_server_example as api
+
+
+@pytest.fixture
+def database(tmp_path):
+    """不启动日志保留后台线程的数据库"""
+    db = api.DataDatabase(str(tmp_path / "app.db"), log_retention_interval=None,
+                          log_archive_dir=str(tmp_path / "archive"))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def make_server(database, monkeypatch):
+    """在系统分配的端口上运行 API 服务器，测试结束时关闭"""
+    # 处理器由 create_api_server 中的闭包创建，请求日志需在类上关闭
+    monkeypatch.setattr(api.ApiRequestHandler, "log_message", lambda self, *args: None)
+    servers = []
+
+    def make(**kwargs):
+        srv = api.create_api_server(database, port=0, **kwargs)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return srv
+
+    yield make
+    for srv in servers:
+        api.shutdown_api_server(srv, database, timeout=2)
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server()
+
+
+def connect(srv):
+    return http.client.HTTPConnection("127.0.0.1", srv.server_address[1], timeout=10)
+
+
+def request(srv, method, path, body=None, headers=None):
+    conn = connect(srv)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+# 连接池
+
+def test_pool_reuses_connection_within_thread(tmp_path):
+    pool = api.ConnectionPool(str(tmp_path / "pool.db"), max_size=1)
+    try:
+        with pool.connection() as outer:
+            with pool.connection() as inner:
+                assert inner is outer
+            assert pool.stats()["in_use"] == 1
+        stats = pool.stats()
+        assert stats["in_use"] == 0 and stats["idle"] == 1 and stats["created"] == 1
+    finally:
+        pool.close()
+
+
+def test_pool_rejects_release_from_other_thread(tmp_path):
+    pool = api.ConnectionPool(str(tmp_path / "pool.db"))
+    conn = pool.acquire()
+    errors = []
+
+    def release():
+        try:
+            pool.release(conn)
+        except sqlite3.ProgrammingError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=release)
+    thread.start()
+    thread.join()
+    assert len(errors) == 1
+    pool.release(conn)
+    pool.close()
+
+
+def test_pool_times_out_when_exhausted(tmp_path):
+    pool = api.ConnectionPool(str(tmp_path / "pool.db"), max_size=1, timeout=0.1)
+    conn = pool.acquire()
+    errors = []
+
+    def borrow():
+        try:
+            pool.acquire()
+        except TimeoutError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    thread.join(5)
+    assert len(errors) == 1 and pool.stats()["timeouts"] == 1
+    pool.release(conn)
+    pool.close()
+
+
+def test_pool_hands_released_connection_to_waiter(tmp_path):
+    pool = api.ConnectionPool(str(tmp_path / "pool.db"), max_size=1, timeout=5)
+    conn = pool.acquire()
+    borrowed = []
+
+    def borrow():
+        with pool.connection() as other:
+            borrowed.append(other)
+
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    time.sleep(0.1)
+    assert not borrowed
+    pool.release(conn)
+    thread.join(5)
+    assert borrowed == [conn]
+    stats = pool.stats()
+    assert stats["waited"] == 1 and stats["created"] == 1
+    pool.close()
+
+
+def test_pool_discards_broken_idle_connection(tmp_path):
+    pool = api.ConnectionPool(str(tmp_path / "pool.db"), max_size=1, health_check_interval=0)
+    with pool.connection() as conn:
+        pass
+    conn.close()
+    with pool.connection() as fresh:
+        assert fresh is not conn
+        assert fresh.execute("SELECT 1").fetchone() == (1,)
+    stats = pool.stats()
+    assert stats["discarded"] == 1 and stats["created"] == 1
+    pool.close()
+
+
+def test_pool_close_wakes_waiters(tmp_path):
+    pool = api.ConnectionPool(str(tmp_path / "pool.db"), max_size=1, timeout=5)
+    conn = pool.acquire()
+    errors = []
+
+    def borrow():
+        try:
+            pool.acquire()
+        except sqlite3.ProgrammingError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    time.sleep(0.1)
+    pool.close()
+    thread.join(5)
+    assert not thread.is_alive() and len(errors) == 1
+    pool.release(conn)
+
+
+# WAL 与单写线程
+
+def test_storage_profiles_set_journal_mode(tmp_path):
+    for profile, journal_mode in (("wal", "wal"), ("rollback", "delete")):
+        db = api.DataDatabase(str(tmp_path / f"{profile}.db"), profile=profile,
+                              log_retention_interval=None)
+        try:
+            with db.pool.connection() as conn:
+                assert conn.execute("PRAGMA journal_mode").fetchone()[0] == journal_mode
+                assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        finally:
+            db.close()
+
+
+def test_writer_rolls_back_only_failed_mutation(tmp_path):
+    path = str(tmp_path / "writer.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER UNIQUE)")
+    writer = api.DatabaseWriter(
+        lambda: sqlite3.connect(path, isolation_level=None, check_same_thread=False))
+
+    def partial_then_fail(conn):
+        conn.execute("INSERT INTO t VALUES (2)")
+        conn.execute("INSERT INTO t VALUES (1)")
+
+    first = writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (1)").lastrowid)
+    failed = writer.submit(partial_then_fail)
+    last = writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (3)").lastrowid)
+    first.result(5)
+    with pytest.raises(sqlite3.IntegrityError):
+        failed.result(5)
+    last.result(5)
+    writer.close()
+
+    with sqlite3.connect(path) as conn:
+        assert [row[0] for row in conn.execute("SELECT x FROM t ORDER BY x")] == [1, 3]
+
+
+def test_concurrent_writes_all_commit(database):
+    def add(start):
+        for i in range(start, start + 20):
+            assert database.add_user(f"u{i}", f"u{i}@example.com", i)["success"]
+
+    threads = [threading.Thread(target=add, args=(n * 20,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with database.pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 80
+
+
+# 服务器并发模式
+
+@pytest.mark.parametrize("mode", api.SERVER_MODES)
+def test_every_mode_serves_requests(make_server, mode):
+    srv = make_server(mode=mode)
+    status, _, body = request(srv, "GET", "/api/status")
+    assert status == 200 and json.loads(body)["status"] == "running"
+
+
+@pytest.mark.parametrize("mode", ["threading", "pool"])
+def test_slow_client_does_not_block_other_requests(make_server, mode):
+    srv = make_server(mode=mode)
+    # 只发出一半请求头的连接占住一个处理线程
+    with socket.create_connection(("127.0.0.1", srv.server_address[1])) as slow:
+        slow.sendall(b"GET /api/status HTTP/1.1\r\n")
+        started = time.monotonic()
+        status, _, _ = request(srv, "GET", "/api/status")
+        assert status == 200
+        assert time.monotonic() - started < api.ApiRequestHandler.timeout
+        slow.sendall(b"Connection: close\r\n\r\n")
+        assert slow.makefile("rb").readline().startswith(b"HTTP/1.1 200")
+
+
+def test_unknown_mode_is_rejected(database):
+    with pytest.raises(ValueError):
+        api.create_api_server(database, port=0, mode="async")
+
+
+# 持久连接
+
+def test_keep_alive_reuses_connection(server):
+    conn = connect(server)
+    try:
+        conn.request("GET", "/api/status")
+        response = conn.getresponse()
+        response.read()
+        assert response.getheader("Keep-Alive") == f"timeout={api.ApiRequestHandler.timeout}, max=99"
+        sock = conn.sock
+        conn.request("GET", "/api/status")
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 200 and conn.sock is sock
+        assert response.getheader("Keep-Alive").endswith("max=98")
+    finally:
+        conn.close()
+
+
+def test_keep_alive_closes_after_max_requests(make_server, monkeypatch):
+    monkeypatch.setattr(api.ApiRequestHandler, "max_keepalive_requests", 2)
+    conn = connect(make_server())
+    try:
+        conn.request("GET", "/api/status")
+        conn.getresponse().read()
+        conn.request("GET", "/api/status")
+        response = conn.getresponse()
+        response.read()
+        assert response.getheader("Connection") == "close"
+    finally:
+        conn.close()
+
+
+def test_single_mode_does_not_keep_connections(make_server):
+    _, headers, _ = request(make_server(mode="single"), "GET", "/api/status")
+    assert headers["Connection"] == "close" and "Keep-Alive" not in headers
+
+
+@pytest.mark.parametrize("max_workers, expected", [(16, 7), (4, 0)])
+def test_pool_idle_connections_leave_workers_for_events(database, max_workers, expected):
+    srv = api.create_api_server(database, port=0, mode="pool", max_workers=max_workers)
+    try:
+        assert srv.max_idle_connections == expected
+    finally:
+        srv.server_close()
+
+
+def test_pool_without_spare_worker_closes_connection(make_server):
+    _, headers, _ = request(make_server(mode="pool", max_workers=4), "GET", "/api/status")
+    assert headers["Connection"] == "close"
+
+
+# 统计信息
+
+def sql_statistics(database):
+    """用聚合查询计算统计信息，与计数器对照"""
+    with database.pool.connection() as conn:
+        users = conn.execute(api.USER_COUNT_SQL).fetchone()[0]
+        tasks = dict(conn.execute(api.TASK_STATUS_COUNT_SQL).fetchall())
+    return users, tasks
+
+
+def test_statistics_counters_follow_writes(database):
+    database.add_user("a", "a@example.com", 1)
+    assert not database.add_user("dup", "a@example.com", 2)["success"]
+    database.add_users_many([{"name": "b", "email": "b@example.com"}, {"name": "c"}])
+    ids = [database.add_task(f"task {i}", "")["task_id"] for i in range(4)]
+    database.add_tasks_many([{"title": "batch"}])
+    database.update_task_status(ids[0], "completed")
+    database.update_task_status(ids[1], "in_progress")
+    database.update_task_status(ids[1], "completed")
+    database.update_task_status(9999, "completed")
+
+    stats = database.get_statistics()
+    assert stats == {
+        "users": {"total": 2},
+        "tasks": {"total": 5, "pending": 3, "in_progress": 0, "completed": 2}
+    }
+    users, tasks = sql_statistics(database)
+    assert users == stats["users"]["total"]
+    assert all(stats["tasks"][status] == count for status, count in tasks.items())
+
+    # 重新打开时由聚合查询加载计数器
+    database.close()
+    reopened = api.DataDatabase(database.db_file, log_retention_interval=None)
+    try:
+        assert reopened.get_statistics() == stats
+    finally:
+        reopened.close()
+
+
+def test_stats_endpoint_includes_recent_logs(server, database):
+    database.add_user("a", "a@example.com", 1)
+    database.add_log("info", "hello")
+    status, _, body = request(server, "GET", "/api/stats")
+    data = json.loads(body)
+    assert status == 200 and data["users"]["total"] == 1
+    assert [log["message"] for log in data["recent_logs"]] == ["hello"]
+
+
+# 键集分页
+
+def test_keyset_pagination_visits_every_row_once(database):
+    response = database.add_tasks_many([{"title": f"task {i}"} for i in range(25)])
+    assert response["inserted"] == 25
+
+    seen = []
+    cursor = None
+    while True:
+        page = database.get_tasks(limit=10, cursor=cursor, fields=["title"])
+        assert all(set(item) == {"title"} for item in page["items"])
+        seen.extend(item["title"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    # created_at 相同时按 id 倒序
+    assert seen == [f"task {i}" for i in reversed(range(25))]
+
+
+def test_invalid_cursor_and_fields_are_rejected(database):
+    with pytest.raises(ValueError):
+        api.decode_cursor("not-a-cursor")
+    with pytest.raises(ValueError):
+        database.get_users(fields=["password"])
+
+
+def test_page_endpoint_follows_cursor(server, database):
+    database.add_users_many([{"name": f"u{i}", "email": f"u{i}@example.com"} for i in range(3)])
+    status, _, body = request(server, "GET", "/api/users?limit=2&fields=email,name")
+    page = json.loads(body)
+    assert status == 200
+    assert page["items"] == [{"name": "u2", "email": "u2@example.com"},
+                             {"name": "u1", "email": "u1@example.com"}]
+
+    status, _, body = request(server, "GET", f"/api/users?limit=2&fields=name&cursor={page['next_cursor']}")
+    assert json.loads(body) == {"items": [{"name": "u0"}], "next_cursor": None}
+
+    for query in ("cursor=bad", "fields=password", "limit=x"):
+        status, _, body = request(server, "GET", f"/api/users?{query}")
+        assert status == 400 and not json.loads(body)["success"]
+
+
+# 索引与查询计划
+
+def test_migrates_legacy_database_without_user_version(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,
+                                email TEXT UNIQUE NOT NULL, age INTEGER,
+                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+            CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
+                                description TEXT, status TEXT DEFAULT 'pending',
+                                priority TEXT DEFAULT 'medium',
+                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                completed_at TIMESTAMP);
+            CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, level TEXT NOT NULL,
+                               message TEXT NOT NULL,
+                               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+            INSERT INTO users (name, email, age) VALUES ('old', 'old@example.com', 30);
+            INSERT INTO tasks (title, status) VALUES ('done', 'completed');
+        """)
+
+    db = api.DataDatabase(path, log_retention_interval=None)
+    try:
+        with db.pool.connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == api.MIGRATIONS[-1][0]
+            indexes = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_users_created_at", "idx_tasks_status", "idx_logs_created_at"} <= indexes
+        assert [user["email"] for user in db.get_users()["items"]] == ["old@example.com"]
+        assert db.get_statistics()["tasks"]["completed"] == 1
+    finally:
+        db.close()
+
+    # 已是最新版本时不再执行迁移
+    db = api.DataDatabase(path, log_retention_interval=None)
+    db.close()
+
+
+def test_shipped_queries_avoid_full_scans(database):
+    with database.pool.connection() as conn:
+        assert database.check_query_plans(conn) == []
+    database.writer.execute(lambda conn: conn.execute("DROP INDEX idx_tasks_created_at"))
+    with sqlite3.connect(database.db_file) as conn:
+        problems = database.check_query_plans(conn)
+    assert problems and all(problem.startswith("tasks ") for problem in problems)
+
+
+# 流式 JSON 响应
+
+def test_page_is_streamed_with_chunked_encoding(server, database):
+    database.add_tasks_many([{"title": f"task {i}", "description": "x" * 100} for i in range(1500)])
+    status, headers, body = request(server, "GET", "/api/tasks?limit=5000")
+    page = json.loads(body)
+    assert status == 200 and headers["Transfer-Encoding"] == "chunked"
+    assert len(page["items"]) == api.MAX_PAGE_SIZE and page["next_cursor"]
+    # 读完后连接已归还连接池
+    assert database.pool.stats()["in_use"] == 0
+
+
+def test_http10_stream_closes_connection(server, database):
+    database.add_task("only", "")
+    with socket.create_connection(("127.0.0.1", server.server_address[1]), timeout=10) as sock:
+        sock.sendall(b"GET /api/tasks HTTP/1.0\r\n\r\n")
+        response = sock.makefile("rb").read()
+    head, _, body = response.partition(b"\r\n\r\n")
+    assert b"Transfer-Encoding" not in head and b"Connection: close" in head
+    assert [item["title"] for item in json.loads(body)["items"]] == ["only"]
+
+
+def test_log_limit_is_clamped(server, database):
+    database.add_logs_many([{"message": f"log {i}"} for i in range(api.MAX_PAGE_SIZE + 1)])
+    assert len(database.get_logs(0)) == 1
+    status, _, body = request(server, "GET", "/api/logs?limit=100000")
+    assert status == 200 and len(json.loads(body)) == api.MAX_PAGE_SIZE
+    status, _, _ = request(server, "GET", "/api/logs?limit=many")
+    assert status == 400
+
+
+# 批量写入
+
+def test_insert_rows_falls_back_to_per_row_results(database):
+    database.add_user("a", "a@example.com", 1)
+    outcomes = database._insert_rows(
+        "INSERT INTO users (name, email, age) VALUES (?, ?, ?)",
+        [("b", "b@example.com", 2), ("dup", "a@example.com", 3), ("c", "c@example.com", 4)])
+    assert isinstance(outcomes[0], int) and isinstance(outcomes[2], int)
+    assert isinstance(outcomes[1], sqlite3.IntegrityError)
+    emails = {user["email"] for user in database.get_users()["items"]}
+    assert emails == {"a@example.com", "b@example.com", "c@example.com"}
+
+
+def test_batch_users_reports_per_item_results(database):
+    database.add_user("exists", "taken@example.com", 20)
+    response = database.add_users_many([
+        {"name": "ok", "email": "ok@example.com", "age": 1},
+        {"email": "noname@example.com"},
+        {"name": "bad age", "email": "age@example.com", "age": "x"},
+        {"name": "bool age", "email": "bool@example.com", "age": True},
+        {"name": "repeat", "email": "ok@example.com"},
+        {"name": "taken", "email": "taken@example.com"},
+        "not an object",
+        {"name": "ok2", "email": "ok2@example.com"},
+    ])
+    assert response["success"]
+    assert response["inserted"] == 2 and response["failed"] == 6
+    results = response["results"]
+    assert [r["index"] for r in results] == list(range(8))
+    assert [r["success"] for r in results] == [True, False, False, False, False, False, False, True]
+    assert results[1]["error"] == "缺少 name"
+    assert results[2]["error"] == "age 必须是整数"
+    assert results[3]["error"] == "age 必须是整数"
+    assert results[4]["error"] == "邮箱重复"
+    assert results[5]["error"] == "邮箱已存在"
+    assert results[6]["error"] == "条目必须是 JSON 对象"
+    assert database.get_statistics()["users"]["total"] == 3
+
+
+def test_batch_endpoint_inserts_tasks(server, database):
+    items = [{"title": "a", "priority": "high"}, {"description": "no title"}, {"title": "b"}]
+    status, _, body = request(server, "POST", "/api/tasks/batch", json.dumps(items),
+                              {"Content-Type": "application/json"})
+    response = json.loads(body)
+    assert status == 200 and response["inserted"] == 2 and response["failed"] == 1
+    tasks = database.get_tasks(fields=["title", "priority"])["items"]
+    assert tasks == [{"title": "b", "priority": "medium"}, {"title": "a", "priority": "high"}]
+
+    status, _, _ = request(server, "POST", "/api/tasks/batch", "{}", {"Content-Type": "application/json"})
+    assert status == 400
+
+
+# 缓冲日志
+
+def test_log_sink_drops_rejected_entries_instead_of_requeueing():
+    calls = []
+    flushed = []
+    next_id = iter(range(1, 100))
+
+    def write_batch(entries):
+        calls.append(len(entries))
+        if len(entries) > 1:
+            raise sqlite3.OperationalError("batch failed")
+        if entries[0][2] == "bad":
+            raise sqlite3.IntegrityError("bad row")
+        return [next(next_id)]
+
+    sink = api.LogSink(write_batch, flush_interval=60, batch_size=100,
+                       on_flush=lambda: flushed.append(True))
+    try:
+        for message in ("one", "bad", "two"):
+            assert sink.put("info", message)
+        sink.flush()
+        assert calls == [3, 1, 1, 1]
+        stats = sink.stats()
+        assert stats["buffered"] == 0 and stats["dropped"] == 1 and stats["watermark"] == 2
+        assert [entry[2] for entry in sink.rejected] == ["bad"]
+        assert flushed
+
+        # 被丢弃的条目不会再次写入
+        sink.flush()
+        assert calls == [3, 1, 1, 1]
+    finally:
+        sink.close()
+
+
+def test_log_sink_rejects_when_full_and_flushes_on_close():
+    written = []
+
+    def write_batch(entries):
+        written.extend(entry[2] for entry in entries)
+        return list(range(1, len(entries) + 1))
+
+    sink = api.LogSink(write_batch, capacity=1, flush_interval=60, batch_size=100)
+    assert sink.put("info", "kept")
+    assert not sink.put("info", "overflow", timeout=0)
+    sink.close()
+    assert written == ["kept"]
+    assert not sink.put("info", "after close")
+
+
+def test_add_log_validates_and_flush_assigns_ids(database):
+    assert not database.add_log(None, "message")["success"]
+    assert not database.add_log("info", "")["success"]
+
+    assert database.add_log("info", "buffered")["success"]
+    assert database.get_logs(1)[0]["id"] is None
+    database.log_sink.flush()
+    log = database.get_logs(1)[0]
+    assert log["message"] == "buffered" and isinstance(log["id"], int)
+
+
+def test_add_log_endpoint_rejects_invalid_entry(server):
+    status, _, body = request(server, "POST", "/api/logs", json.dumps({"level": "info"}),
+                              {"Content-Type": "application/json"})
+    assert status == 400 and not json.loads(body)["success"]
+
+
+# 日志分区滚动与过期
+
+def test_batch_logs_normalize_created_at(database):
+    response = database.add_logs_many([
+        {"message": "utc", "created_at": "2024-01-31T10:00:00+08:00"},
+        {"message": "bad", "created_at": "yesterday"},
+        {"level": 1, "message": "level"},
+    ])
+    assert [r["success"] for r in response["results"]] == [True, False, False]
+    assert response["results"][1]["error"] == "created_at 不是有效的 ISO 8601 时间"
+    logs = database.get_logs(10)
+    assert [(log["message"], log["created_at"]) for log in logs] == [("utc", "2024-01-31 02:00:00")]
+
+
+def test_rollover_moves_old_days_and_expire_archives(database, tmp_path):
+    today = date(2024, 2, 10)
+    database.add_logs_many([
+        {"message": "old", "created_at": "2024-01-01T12:00:00"},
+        {"message": "recent", "created_at": "2024-02-08T12:00:00"},
+        {"message": "today", "created_at": "2024-02-10T08:00:00"},
+    ])
+    # 不是日期格式的 created_at 无法归入分区，留在热分区
+    database.writer.execute(lambda conn: conn.execute(
+        "INSERT INTO logs (level, message, created_at) VALUES ('info', 'odd', '???')"))
+
+    assert database.log_retention.rollover(today) == 2
+    with database.pool.connection() as conn:
+        assert database.log_retention.partitions(conn) == ["logs_20240208", "logs_20240101"]
+        hot = sorted(row[0] for row in conn.execute("SELECT message FROM logs"))
+    assert hot == ["odd", "today"]
+    # 绕过 LogSink 写入的行超出水位线，读取时不可见
+    assert [log["message"] for log in database.get_logs(10)] == ["today", "recent", "old"]
+
+    assert database.log_retention.expire(today) == ["logs_20240101"]
+    with database.pool.connection() as conn:
+        assert database.log_retention.partitions(conn) == ["logs_20240208"]
+    with sqlite3.connect(str(tmp_path / "archive" / "logs_20240101.db")) as archive:
+        assert [row[0] for row in archive.execute("SELECT message FROM logs")] == ["old"]
+
+
+def test_recent_logs_merge_hot_and_partitions_by_time(database):
+    database.add_logs_many([
+        {"message": "jan 1", "created_at": "2024-01-01T12:00:00"},
+        {"message": "feb 8", "created_at": "2024-02-08T12:00:00"},
+    ])
+    database.log_retention.rollover(date(2024, 2, 10))
+    # 滚动之后导入的旧日期日志留在热分区
+    database.add_logs_many([
+        {"message": "jan 15", "created_at": "2024-01-15T12:00:00"},
+        {"message": "feb 10", "created_at": "2024-02-10T12:00:00"},
+    ])
+    database.add_log("info", "buffered")
+
+    messages = [log["message"] for log in database.get_logs(10)]
+    assert messages == ["buffered", "feb 10", "feb 8", "jan 15", "jan 1"]
+    assert [log["message"] for log in database.get_logs(4)] == messages[:4]
+
+
+# 变更推送
+
+def test_change_feed_limits_subscribers_and_marks_resync():
+    feed = api.ChangeFeed(max_subscribers=1, max_queue=2)
+    subscriber = feed.subscribe()
+    assert feed.subscribe() is None
+    for i in range(3):
+        feed.publish({"table": "tasks", "op": "insert", "n": i})
+    events = [subscriber.get_nowait() for _ in range(2)]
+    assert [event["n"] for event in events] == [1, 2]
+    assert events[-1]["resync"] and events[-1]["seq"] == 3
+
+    # 队列已满时关闭信号仍能送达
+    feed.publish({"table": "tasks", "op": "insert", "n": 3})
+    feed.publish({"table": "tasks", "op": "insert", "n": 4})
+    feed.close()
+    assert [subscriber.get_nowait() for _ in range(2)][-1] is None
+    assert feed.closed and feed.subscribe() is None
+
+
+def test_coalesce_merges_consecutive_log_inserts():
+    events = [
+        {"table": "logs", "op": "insert", "count": 1, "seq": 1},
+        {"table": "logs", "op": "insert", "count": 2, "seq": 2, "resync": True},
+        {"table": "tasks", "op": "insert", "seq": 3},
+        {"table": "logs", "op": "insert", "count": 1, "seq": 4},
+        None,
+    ]
+    merged = api.ApiRequestHandler.coalesce_events(events)
+    assert [(e["table"], e.get("count"), e["seq"]) for e in merged[:3]] == [
+        ("logs", 3, 2), ("tasks", None, 3), ("logs", 1, 4)]
+    assert merged[0]["resync"] and merged[-1] is None
+
+
+def read_event(response):
+    """读取一条 SSE 事件，跳过心跳"""
+    fields = {}
+    while True:
+        line = response.readline().decode("utf-8").rstrip("\n")
+        if not line:
+            if fields:
+                return fields
+            continue
+        if line.startswith(":"):
+            continue
+        name, _, value = line.partition(": ")
+        fields[name] = value
+
+
+def test_event_stream_sends_snapshot_then_changes(make_server, database):
+    conn = connect(make_server(mode="pool"))
+    try:
+        conn.request("GET", "/api/events")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.getheader("Content-Type") == "text/event-stream"
+        snapshot = read_event(response)
+        assert snapshot["event"] == "snapshot"
+        assert json.loads(snapshot["data"])["stats"]["users"]["total"] == 0
+
+        database.add_user("a", "a@example.com", 1)
+        change = read_event(response)
+        data = json.loads(change["data"])
+        assert change["event"] == "change" and change["id"] == str(data["seq"])
+        assert data["table"] == "users" and data["stats"]["users"]["total"] == 1
+    finally:
+        conn.close()
+
+
+def test_event_stream_is_refused_in_single_mode(make_server):
+    status, _, body = request(make_server(mode="single"), "GET", "/api/events")
+    assert status == 503 and not json.loads(body)["success"]
+
+
+# ETag 与条件请求
+
+def test_etag_not_modified_until_table_changes(server, database):
+    database.add_task("first", "")
+    status, headers, body = request(server, "GET", "/api/tasks")
+    assert status == 200
+    etag = headers["ETag"]
+    assert [item["title"] for item in json.loads(body)["items"]] == ["first"]
+
+    status, headers, body = request(server, "GET", "/api/tasks", headers={"If-None-Match": etag})
+    assert status == 304 and body == b""
+    status, _, _ = request(server, "GET", "/api/tasks", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert status == 304
+
+    # 其他表的写入不影响
+    database.add_user("a", "a@example.com", 1)
+    status, _, _ = request(server, "GET", "/api/tasks", headers={"If-None-Match": etag})
+    assert status == 304
+
+    database.add_task("second", "")
+    status, headers, body = request(server, "GET", "/api/tasks", headers={"If-None-Match": etag})
+    assert status == 200 and headers["ETag"] != etag
+    assert len(json.loads(body)["items"]) == 2
+
+
+def test_etag_depends_on_query(server):
+    _, first, _ = request(server, "GET", "/api/tasks?limit=1")
+    _, second, _ = request(server, "GET", "/api/tasks?limit=2")
+    assert first["ETag"] != second["ETag"]
+
+
+def test_log_flush_changes_etag(database):
+    database.add_log("info", "buffered")
+    etag = database.make_etag(("logs",))
+    database.log_sink.flush()
+    assert database.make_etag(("logs",)) != etag
+
+
+# 响应压缩
+
+@pytest.mark.parametrize("header, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0.5, deflate", "deflate"),
+    ("gzip;q=0, *", "deflate"),
+    ("*;q=0", None),
+    ("GZIP", "gzip"),
+])
+def test_negotiate_encoding(header, expected, monkeypatch):
+    monkeypatch.setattr(api, "brotli", None)
+    assert api.negotiate_encoding(header) == expected
+
+
+def test_compress_body_round_trips():
+    body = b'{"items":[' + b'{"x":1},' * 500 + b'{}]}'
+    assert gzip.decompress(api.compress_body(body, "gzip")) == body
+    assert zlib.decompress(api.compress_body(body, "deflate")) == body
+
+
+def test_large_streamed_response_is_compressed(server, database):
+    database.add_tasks_many([{"title": f"task {i}"} for i in range(200)])
+    status, headers, body = request(server, "GET", "/api/tasks", headers={"Accept-Encoding": "gzip"})
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert headers["ETag"].endswith('-gzip"')
+    assert len(json.loads(gzip.decompress(body))["items"]) == 100
+
+
+def test_small_response_is_not_compressed(server):
+    _, headers, body = request(server, "GET", "/api/status", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in headers and headers["Vary"] == "Accept-Encoding"
+    assert json.loads(body)["status"] == "running"
+
+
+def test_compression_can_be_disabled(make_server, database):
+    database.add_tasks_many([{"title": f"task {i}"} for i in range(200)])
+    srv = make_server(compression_level=0)
+    _, headers, body = request(srv, "GET", "/api/tasks", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in headers
+    assert len(json.loads(body)["items"]) == 100
+
+
+# 查询缓存
+
+def test_query_cache_hits_until_table_changes(database):
+    database.add_task("first", "")
+    database.get_tasks()
+    database.get_tasks()
+    stats = database.cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["entries"] == 1
+
+    # 其他表的写入不影响
+    database.add_user("a", "a@example.com", 1)
+    assert database.cache.stats()["entries"] == 1
+
+    database.add_task("second", "")
+    assert database.cache.stats()["invalidations"] == 1
+    assert [item["title"] for item in database.get_tasks()["items"]] == ["second", "first"]
+
+
+def test_query_cache_evicts_least_recently_used():
+    versions = {"t": 0}
+    cache = api.QueryCache(versions.get, max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, "t", 0, key, 10)
+    cache.get("a")
+    cache.put("c", "t", 0, "c", 10)
+    assert cache.get("b") is None and cache.get("a") == "a" and cache.get("c") == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_query_cache_skips_stale_and_oversized_results():
+    versions = {"t": 1}
+    cache = api.QueryCache(versions.get, max_bytes=400)
+    # 读取期间表已变更
+    cache.put("stale", "t", 0, "value", 10)
+    # 超过单条目上限（总预算的四分之一）
+    cache.put("big", "t", 1, "value", 101)
+    assert cache.get("stale") is None and cache.get("big") is None
+
+
+def test_query_cache_expires_entries():
+    cache = api.QueryCache(lambda table: 0, ttl=0)
+    cache.put("key", "t", 0, "value", 10)
+    time.sleep(0.01)
+    assert cache.get("key") is None and cache.stats()["expirations"] == 1
+
+
+def test_cache_endpoint_reports_stats(server, database):
+    request(server, "GET", "/api/tasks")
+    request(server, "GET", "/api/tasks")
+    status, _, body = request(server, "GET", "/api/cache")
+    stats = json.loads(body)
+    assert status == 200 and stats["hits"] == 1 and stats["hit_rate"] == 0.5
+
+
+# 行编码
+
+def test_row_encoder_matches_json_value():
+    fields = ("id", 'quote"d', "100%", "blob", "nan", "inf", "none", "flag", "text", "big")
+    row = (1, 2.5, -0.0, b"\x00\xff", float("nan"), float("-inf"), None, True,
+           'a"b\\c\n中文 ', 2 ** 70)
+    encoded = api.RowEncoder.for_fields(fields).encode(row)
+    expected = {name: api.json_value(value) for name, value in zip(fields, row)}
+    assert json.loads(encoded) == expected
+    assert expected["blob"] == "AP8=" and expected["nan"] is None and expected["inf"] is None
+    assert api.RowEncoder.for_fields(list(fields)) is api.RowEncoder.for_fields(fields)
+
+
+def test_pretty_output_matches_compact(server, database):
+    database.add_task('quote " and 中文', "line\nbreak")
+    _, _, compact = request(server, "GET", "/api/tasks")
+    _, _, pretty = request(server, "GET", "/api/tasks?pretty=1")
+    assert b"\n" in pretty and b"\n" not in compact
+    assert json.loads(pretty) == json.loads(compact)
+
+
+# 路由表
+
+def test_router_matches_and_converts_params():
+    router = api.Router([
+        ("GET", "/items", "list_items"),
+        ("POST", "/items", "add_item"),
+        ("PUT", "/items/<int:item_id>", "update_item", ("items",)),
+        ("POST", "/<a|b:kind>/batch", "batch"),
+    ])
+    route, params = router.match("GET", "/items")
+    assert route.handlers["GET"] == "list_items" and params == {}
+    route, params = router.match("PUT", "/items/42")
+    assert params == {"item_id": 42} and route.etag_tables == ("items",)
+    assert router.match("POST", "/b/batch")[1] == {"kind": "b"}
+
+    with pytest.raises(api.RouteNotFound):
+        router.match("POST", "/c/batch")
+    with pytest.raises(api.RouteNotFound):
+        router.match("PUT", "/items/1/extra")
+    with pytest.raises(api.MethodNotAllowed) as excinfo:
+        router.match("DELETE", "/items")
+    assert excinfo.value.allowed == ["GET", "POST"]
+    for value in ("0", "-1", "abc", "١", str(2 ** 63)):
+        with pytest.raises(ValueError):
+            router.match("PUT", f"/items/{value}")
+
+
+def test_routing_errors_over_http(server, database):
+    task_id = database.add_task("t", "")["task_id"]
+    status, _, body = request(server, "PUT", f"/api/tasks/{task_id}", json.dumps({"status": "completed"}),
+                              {"Content-Type": "application/json"})
+    assert status == 200 and json.loads(body)["success"]
+
+    status, headers, _ = request(server, "POST", "/api/status")
+    assert status == 405 and headers["Allow"] == "GET"
+    status, _, _ = request(server, "PUT", "/api/tasks/abc", "{}")
+    assert status == 400
+    status, _, _ = request(server, "GET", "/api/unknown")
+    assert status == 404
+
+
+# 请求指标
+
+def test_request_metrics_render_prometheus_text():
+    metrics = api.RequestMetrics(slow_request_threshold=None)
+    metrics.request_started()
+    metrics.request_finished("GET", "/api/tasks", "200",
+                             {"total": 0.003, "db": 0.001, "encode": 0.0005, "bytes": 2000})
+    assert not metrics.is_slow(100)
+    text = metrics.render({"api_custom": ("自定义", 7)})
+    assert 'api_requests_total{method="GET",route="/api/tasks",status="200"} 1' in text
+    assert 'api_request_duration_seconds_bucket{method="GET",route="/api/tasks",le="0.0025"} 0' in text
+    assert 'api_request_duration_seconds_bucket{method="GET",route="/api/tasks",le="0.005"} 1' in text
+    assert 'api_response_bytes_bucket{method="GET",route="/api/tasks",le="+Inf"} 1' in text
+    assert "api_requests_in_flight 0" in text and "api_custom 7" in text
+
+
+def test_metrics_endpoint_counts_requests(server):
+    request(server, "GET", "/api/status")
+    request(server, "GET", "/api/unknown")
+    # 指标在响应发出后才记录
+    deadline = time.monotonic() + 5
+    while server.metrics.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    status, headers, body = request(server, "GET", "/api/metrics")
+    text = body.decode("utf-8")
+    assert status == 200 and headers["Content-type"].startswith("text/plain")
+    assert 'api_requests_total{method="GET",route="/api/status",status="200"} 1' in text
+    assert 'api_requests_total{method="GET",route="unmatched",status="404"} 1' in text
+    assert "api_db_pool_in_use" in text and "api_query_cache_hits" in text
+
+
+def test_slow_requests_are_logged_without_change_events(make_server, database):
+    srv = make_server(metrics=api.RequestMetrics(slow_request_threshold=0))
+    subscriber = database.changes.subscribe()
+    request(srv, "GET", "/api/status")
+    # 慢请求日志在响应发出后才写入缓冲区
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        stats = database.log_sink.stats()
+        if stats["buffered"] or stats["watermark"]:
+            break
+        time.sleep(0.01)
+    database.log_sink.flush()
+    logs = database.get_logs(10)
+    assert [log["level"] for log in logs] == ["warning"]
+    assert logs[0]["message"].startswith("[慢请求] GET /api/status 状态 200")
+    assert subscriber.empty() and srv.metrics.slow_requests == 1
+
+
+# 启动握手与优雅关闭
+
+def test_server_ready_times_out():
+    with pytest.raises(TimeoutError):
+        api.ServerReady().wait(0.01)
+
+
+@pytest.mark.parametrize("mode", api.SERVER_MODES)
+def test_run_and_shutdown_with_idle_connection(database, monkeypatch, mode):
+    monkeypatch.setattr(api.ApiRequestHandler, "log_message", lambda self, *args: None)
+    ready = api.ServerReady()
+    thread = threading.Thread(target=api.run_api_server, args=(database,),
+                              kwargs={"port": 0, "mode": mode, "ready": ready}, daemon=True)
+    thread.start()
+    srv = ready.wait(5)
+    assert srv.server_address[1] != 0
+
+    # 保持一个空闲的持久连接
+    conn = connect(srv)
+    conn.request("GET", "/api/status")
+    assert conn.getresponse().read()
+    started = time.monotonic()
+    api.shutdown_api_server(srv, database, timeout=3)
+    thread.join(3)
+    assert not thread.is_alive() and time.monotonic() - started < 3
+    conn.close()
+
+
+def test_run_reports_bind_failure(database):
+    with socket.socket() as taken:
+        taken.bind(("localhost", 0))
+        taken.listen()
+        ready = api.ServerReady()
+        api.run_api_server(database, port=taken.getsockname()[1], ready=ready)
+        with pytest.raises(OSError):
+            ready.wait(1)
+
+
+# 请求体上限与流式解析
+
+ARRAY_VALUES = [1, -2.5e3, "a\\\"b,]}", {"x": [1, {"y": "]"}], "z": "\\"}, [], {},
+                True, None, "中文", 12345678901234567890, [[["deep"]]]]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64, 4096])
+def test_iter_json_array_across_chunk_boundaries(size):
+    body = json.dumps(ARRAY_VALUES, ensure_ascii=False, indent=1).encode("utf-8")
+    chunks = [body[i:i + size] for i in range(0, len(body), size)]
+    assert list(api.iter_json_array(iter(chunks))) == ARRAY_VALUES
+
+
+@pytest.mark.parametrize("body", [b"", b"{}", b"[1,", b"[1 2]", b"[1]x", b'["abc', b"[12", b'[{"a":1]'])
+@pytest.mark.parametrize("size", [1, 3, 100])
+def test_iter_json_array_rejects_malformed_input(body, size):
+    chunks = [body[i:i + size] for i in range(0, len(body), size)]
+    with pytest.raises(ValueError):
+        list(api.iter_json_array(iter(chunks)))
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 4096])
+def test_iter_json_lines_across_chunk_boundaries(size):
+    body = "\n".join(json.dumps(value, ensure_ascii=False) for value in ARRAY_VALUES)
+    body = ("\r\n\n" + body + "\r\n").encode("utf-8")
+    chunks = [body[i:i + size] for i in range(0, len(body), size)]
+    assert list(api.iter_json_lines(iter(chunks))) == ARRAY_VALUES
+
+
+def body_reader(data, **headers):
+    return api.RequestBody(io.BytesIO(data), headers)
+
+
+def test_request_body_reads_chunked_encoding():
+    body = body_reader(b"5;ext=1\r\nhello\r\n6\r\n world\r\n0\r\nTrailer: x\r\n\r\n",
+                       **{"Transfer-Encoding": "chunked"})
+    assert body.read() == b"hello world" and body.done
+
+
+@pytest.mark.parametrize("data, headers, status", [
+    (b"x" * 11, {"Content-Length": "11"}, 413),
+    (b"8\r\n12345678\r\n8\r\n12345678\r\n0\r\n\r\n", {"Transfer-Encoding": "chunked"}, 413),
+    (b"zz\r\n", {"Transfer-Encoding": "chunked"}, 400),
+    (b"", {"Transfer-Encoding": "gzip"}, 501),
+    (b"", {"Content-Length": "-1"}, 400),
+    (b"abc", {"Content-Length": "5"}, 400),
+])
+def test_request_body_rejects_bad_bodies(data, headers, status):
+    with pytest.raises(api.RequestBodyError) as excinfo:
+        body = body_reader(data, **headers)
+        body.limit(10)
+        body.read()
+    assert excinfo.value.status == status
+
+
+def test_oversized_body_is_rejected_over_http(server):
+    conn = connect(server)
+    try:
+        conn.request("POST", "/api/users", b"x" * (api.ApiRequestHandler.max_body_size + 1),
+                     {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 413 and response.getheader("Connection") == "close"
+    finally:
+        conn.close()
+
+
+def test_batch_endpoint_accepts_ndjson(server, database):
+    body = "\n".join(json.dumps({"message": f"log {i}"}) for i in range(3)) + "\n"
+    status, _, response = request(server, "POST", "/api/logs/batch", body,
+                                  {"Content-Type": "application/x-ndjson"})
+    assert status == 200 and json.loads(response)["inserted"] == 3
+    assert [log["message"] for log in database.get_logs(10)] == ["log 2", "log 1", "log 0"]
@@ -0,0 +1,391 @@
+"""file_operations_example 的单元测试
+
+运行: python -m pytest test_file_operations_example.py
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+import file_operations_example as fo
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """文件名索引放在临时目录中的文件管理器"""
+    fm = fo.FileManager(index_file=str(tmp_path / "index" / "files.db"))
+    yield fm
+    fm._close()
+
+
+def make_tree(root, files=(), directories=()):
+    """在 root 下创建文件（内容为文件名）和目录"""
+    for name in directories:
+        os.makedirs(root / name, exist_ok=True)
+    for name in files:
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(name)
+    return root
+
+
+# scandir 列目录
+
+def test_read_directory_matches_listdir_implementation(tmp_path):
+    make_tree(tmp_path, files=["b.TXT", "a.py", "noext"], directories=["Sub"])
+    os.symlink(tmp_path / "Sub", tmp_path / "link")
+    key = lambda item: item["name"]
+    assert sorted(fo.FileManager._read_directory(str(tmp_path)), key=key) == \
+        sorted(fo.list_directory_legacy(str(tmp_path)), key=key)
+
+    counts = fo.count_filesystem_calls(fo.FileManager._read_directory, str(tmp_path))
+    assert counts == {"listdir": 0, "scandir": 1, "stat": 5}
+
+
+def test_read_directory_skips_broken_links(tmp_path):
+    make_tree(tmp_path, files=["kept"])
+    os.symlink(tmp_path / "missing", tmp_path / "dangling")
+    assert [item["name"] for item in fo.FileManager._read_directory(str(tmp_path))] == ["kept"]
+
+
+def test_list_directory_puts_directories_first(manager, tmp_path):
+    make_tree(tmp_path, files=["a.txt", "C.txt"], directories=["b", "D"])
+    result = manager.list_directory(str(tmp_path))
+    assert result["success"] and result["directory"] == str(tmp_path)
+    assert [item["name"] for item in result["items"]] == ["b", "D", "a.txt", "C.txt"]
+    assert manager.get_current_directory()["path"] == str(tmp_path)
+
+    assert not manager.list_directory(str(tmp_path / "missing"))["success"]
+    assert manager.list_directory(str(tmp_path / "a.txt"))["error"] == "不是目录"
+
+
+# 分页列目录
+
+def test_list_directory_page_pages_through_snapshot(manager, tmp_path):
+    make_tree(tmp_path, files=[f"f{i:02d}" for i in range(5)], directories=["dir"])
+    first = manager.list_directory_page(str(tmp_path), limit=4)
+    assert first["success"] and first["total"] == 6 and first["has_more"]
+    assert [item["name"] for item in first["items"]] == ["dir", "f00", "f01", "f02"]
+
+    # 同一快照内翻页不受新文件影响
+    assert manager.create_file("f-new")["success"]
+    second = manager.list_directory_page(offset=4, limit=4, snapshot_id=first["snapshot_id"])
+    assert [item["name"] for item in second["items"]] == ["f03", "f04"]
+    assert second["total"] == 6 and not second["has_more"]
+
+    fresh = manager.list_directory_page(str(tmp_path))
+    assert fresh["total"] == 7 and fresh["snapshot_id"] != first["snapshot_id"]
+
+
+def test_list_directory_page_sorts_with_directories_first(manager, tmp_path):
+    make_tree(tmp_path, directories=["z-dir", "a-dir"])
+    for name, size in (("small", 1), ("large", 100), ("medium", 10)):
+        (tmp_path / name).write_bytes(b"x" * size)
+    page = manager.list_directory_page(str(tmp_path), sort="size", descending=True)
+    assert [item["name"] for item in page["items"]] == ["z-dir", "a-dir", "large", "medium", "small"]
+    assert not manager.list_directory_page(str(tmp_path), sort="owner")["success"]
+
+
+def test_evicted_snapshot_reports_expired(manager, tmp_path):
+    first = manager.list_directory_page(str(tmp_path))
+    for _ in range(manager._max_snapshots):
+        manager.list_directory_page(str(tmp_path))
+    result = manager.list_directory_page(snapshot_id=first["snapshot_id"])
+    assert not result["success"] and result["expired"]
+
+
+def test_navigate_to_parent_returns_directory_only(manager, tmp_path):
+    make_tree(tmp_path, directories=["child"])
+    manager.change_directory(str(tmp_path / "child"))
+    assert manager.navigate_to_parent() == {"success": True, "directory": str(tmp_path)}
+
+
+# 流式列目录
+
+class EventRecorder:
+    """记录 notify 推送的事件，可等待某个列目录任务结束"""
+
+    def __init__(self):
+        self.events = []
+        self._cond = threading.Condition()
+
+    def __call__(self, event, payload):
+        with self._cond:
+            self.events.append((event, payload))
+            self._cond.notify_all()
+
+    def wait_done(self, listing_id, timeout=5):
+        with self._cond:
+            assert self._cond.wait_for(lambda: self.done(listing_id), timeout)
+            return self.done(listing_id)
+
+    def done(self, listing_id):
+        return next((payload for event, payload in self.events
+                     if event in ("listing-done", "listing-error")
+                     and payload["listing_id"] == listing_id), None)
+
+    def batches(self, listing_id):
+        return [payload for event, payload in self.events
+                if event == "listing-batch" and payload["listing_id"] == listing_id]
+
+
+@pytest.fixture
+def recorder():
+    return EventRecorder()
+
+
+@pytest.fixture
+def pushing_manager(tmp_path, recorder):
+    fm = fo.FileManager(notify=recorder, index_file=str(tmp_path / "index" / "files.db"))
+    yield fm
+    fm._close()
+
+
+def test_start_listing_pushes_batches(pushing_manager, recorder, tmp_path):
+    make_tree(tmp_path / "list", files=[f"f{i}" for i in range(5)])
+    started = pushing_manager.start_listing(str(tmp_path / "list"), listing_id="abc", batch_size=2)
+    assert started == {"success": True, "listing_id": "abc", "directory": str(tmp_path / "list")}
+
+    done = recorder.wait_done("abc")
+    assert not done["cancelled"] and done["total"] == 5
+    batches = recorder.batches("abc")
+    assert all(len(batch["items"]) <= 2 for batch in batches)
+    assert batches[-1]["loaded"] == 5
+    assert sorted(item["name"] for batch in batches for item in batch["items"]) == \
+        [f"f{i}" for i in range(5)]
+
+    page = pushing_manager.list_directory_page(snapshot_id=done["snapshot_id"])
+    assert page["total"] == 5
+
+
+def test_new_listing_cancels_previous(tmp_path, recorder):
+    make_tree(tmp_path, files=["a", "b", "c"])
+    release = threading.Event()
+
+    def notify(event, payload):
+        # 第一个任务推送第一批后停住，直到第二个任务开始
+        if payload["listing_id"] == "first" and event == "listing-batch":
+            release.wait(5)
+        recorder(event, payload)
+
+    fm = fo.FileManager(notify=notify, index_file=str(tmp_path / "index" / "files.db"))
+    try:
+        fm.start_listing(str(tmp_path), listing_id="first", batch_size=1)
+        fm.start_listing(str(tmp_path), listing_id="second")
+        release.set()
+        assert recorder.wait_done("first")["cancelled"]
+        assert recorder.wait_done("second")["total"] == 3
+        assert not fm.cancel_listing("first")["success"]
+    finally:
+        fm._close()
+
+
+def test_start_listing_needs_notify(manager, tmp_path):
+    assert not manager.start_listing(str(tmp_path))["success"]
+
+
+# 目录缓存与变化监视
+
+def items_named(*names):
+    return [{"name": name, "path": name} for name in names]
+
+
+def test_directory_cache_evicts_and_checks_generation():
+    cache = fo.DirectoryCache(max_directories=2)
+    assert cache.put("/a", items_named("x"), 0) == []
+    assert cache.put("/b", items_named("y"), 0) == []
+    cache.get("/a")
+    assert cache.put("/c", items_named("z"), 0) == ["/b"]
+
+    # 扫描期间目录已失效，结果不写入
+    generation = cache.generation("/d")
+    cache.invalidate("/d")
+    assert cache.put("/d", items_named("w"), generation) == ["/d"]
+    assert "/d" not in cache
+
+    cache.invalidate()
+    assert cache.stats()["directories"] == 0
+
+
+def test_directory_cache_max_age():
+    cache = fo.DirectoryCache(max_age=0)
+    cache.put("/a", items_named("x"), 0)
+    time.sleep(0.01)
+    assert cache.get("/a") is None and "/a" not in cache
+
+
+def test_cached_listing_skips_filesystem(manager, tmp_path):
+    make_tree(tmp_path, files=["a", "b"])
+    manager.list_directory(str(tmp_path))
+    counts = fo.count_filesystem_calls(manager._scan_directory, str(tmp_path))
+    assert counts["scandir"] == 0 and counts["stat"] == 0
+    assert manager.get_cache_stats()["cache"]["hits"] == 1
+
+    assert manager.delete_item(str(tmp_path / "a"))["success"]
+    assert [item["name"] for item in manager.list_directory(str(tmp_path))["items"]] == ["b"]
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_external_change_invalidates_cache(pushing_manager, recorder, tmp_path):
+    if not pushing_manager._watcher.detects_file_changes:
+        pytest.skip("当前平台没有 inotify")
+    make_tree(tmp_path, files=["a"])
+    pushing_manager.list_directory(str(tmp_path))
+    (tmp_path / "b").write_text("b")
+    assert wait_for(lambda: ("directory-changed", {"directory": str(tmp_path)}) in recorder.events)
+    names = [item["name"] for item in pushing_manager.list_directory(str(tmp_path))["items"]]
+    assert names == ["a", "b"]
+
+
+def test_polling_watcher_reports_new_entries(tmp_path):
+    changed = []
+    watcher = fo.PollingWatcher(changed.append, interval=0.02)
+    try:
+        assert watcher.watch(str(tmp_path))
+        assert not watcher.watch(str(tmp_path / "missing"))
+        time.sleep(0.05)
+        (tmp_path / "new").write_text("new")
+        assert wait_for(lambda: changed == [str(tmp_path)])
+    finally:
+        watcher.close()
+    assert not watcher.watch(str(tmp_path))
+
+
+def test_polling_watcher_limits_cache_age(tmp_path, monkeypatch):
+    monkeypatch.setattr(fo, "create_directory_watcher", fo.PollingWatcher)
+    fm = fo.FileManager(index_file=str(tmp_path / "index" / "files.db"))
+    try:
+        stats = fm.get_cache_stats()["cache"]
+        assert stats["watcher"] == "PollingWatcher" and stats["max_age"] == fo.POLLING_CACHE_MAX_AGE
+    finally:
+        fm._close()
+
+
+def test_js_api_exposes_only_page_methods(manager):
+    # pywebview 把所有不以下划线开头的属性暴露给页面
+    public = {name for name in dir(manager) if not name.startswith("_")}
+    assert public == {
+        "add_to_recent_files", "bookmarks", "cancel_listing", "change_directory", "copy_item",
+        "create_directory", "create_file", "current_directory", "delete_item", "get_cache_stats",
+        "get_current_directory", "get_drive_info", "get_file_info", "get_index_stats",
+        "get_recent_files", "list_directory", "list_directory_page", "max_recent_files",
+        "move_item", "navigate_to_parent", "read_file", "recent_files", "rename_item",
+        "search_files", "start_listing", "write_file",
+    }
+
+
+# 文件名索引
+
+@pytest.fixture(params=[True, False], ids=["trigram", "scan"])
+def file_index(request, tmp_path):
+    index = fo.FileNameIndex(str(tmp_path / "index" / "files.db"))
+    if not request.param:
+        index.use_trigram = False
+    elif not index.use_trigram:
+        index.close()
+        pytest.skip("SQLite 不支持 trigram 分词器")
+    yield index
+    index.close()
+
+
+def search_names(index, pattern, directory, **kwargs):
+    total, rows = index.search(pattern, str(directory), **kwargs)
+    return total, [os.path.relpath(os.path.join(d, name), directory) for d, name, _, _ in rows]
+
+
+def test_index_matches_substrings_in_subtree(file_index, tmp_path):
+    root = make_tree(tmp_path / "tree", files=[
+        "dir/Report.TXT", "dir/nested/report-2.md", "dir/a*b", "dir/x",
+        "dir-other/report.txt", "readme",
+    ])
+    assert file_index.refresh_in_background(str(root)).wait(5)
+
+    assert search_names(file_index, "PORT", root / "dir") == (
+        2, ["Report.TXT", os.path.join("nested", "report-2.md")])
+    # 少于 3 个字符的关键字同样按子串匹配
+    assert search_names(file_index, "po", root / "dir")[0] == 2
+    assert search_names(file_index, "x", root / "dir")[1] == ["Report.TXT", "x"]
+    assert search_names(file_index, "a*b", root / "dir")[1] == ["a*b"]
+    assert search_names(file_index, "*", root)[0] == 1
+    assert search_names(file_index, "rep", root)[0] == 3
+    # 按目录、文件名排序
+    assert search_names(file_index, "report", root, offset=1, limit=1) == (
+        3, [os.path.join("dir-other", "report.txt")])
+
+
+def test_index_refresh_rescans_only_changed_directories(file_index, tmp_path):
+    root = make_tree(tmp_path / "tree", files=["a/one", "b/two", "c/three"])
+    assert file_index._refresh(str(root)) == 4
+    assert file_index._refresh(str(root)) == 0
+
+    (root / "a" / "new").write_text("new")
+    for path in (root / "c").iterdir():
+        path.unlink()
+    (root / "c").rmdir()
+    assert file_index._refresh(str(root)) == 2
+    assert search_names(file_index, "new", root)[0] == 1
+    assert search_names(file_index, "three", root)[0] == 0
+    assert file_index.stats()["directories"] == 3
+
+
+def test_index_applies_directory_changes_in_background(file_index, tmp_path):
+    root = make_tree(tmp_path / "tree", files=["a/one"])
+    file_index._refresh(str(root))
+    make_tree(root, files=["a/sub/deep", "a/two"])
+    assert file_index.directory_changed(str(root / "a")).wait(5)
+    assert search_names(file_index, "deep", root)[0] == 1
+    assert search_names(file_index, "two", root)[0] == 1
+
+    for path in (root / "a" / "sub").iterdir():
+        path.unlink()
+    (root / "a" / "sub").rmdir()
+    assert file_index.directory_changed(str(root / "a" / "sub")).wait(5)
+    assert search_names(file_index, "deep", root)[0] == 0
+
+
+def test_search_files_opens_index_lazily(manager, tmp_path):
+    root = make_tree(tmp_path / "tree", files=["notes.txt", "sub/todo.txt"])
+    manager.list_directory(str(root))
+    assert manager._file_index is None
+
+    result = manager.search_files(".TXT", str(root), limit=1)
+    assert result["success"] and not result["indexing"]
+    assert result["total"] == 2 and result["count"] == 1 and result["has_more"]
+    assert result["results"][0]["path"] == str(root / "notes.txt")
+    assert manager.get_index_stats()["index"]["roots"][0]["path"] == str(root)
+
+    assert not manager.search_files("", str(root))["success"]
+    assert not manager.search_files("x", str(root / "missing"))["success"]
+
+
+def test_search_sees_files_created_through_manager(manager, tmp_path):
+    root = make_tree(tmp_path / "tree", files=["old"])
+    manager.search_files("old", str(root))
+    manager.change_directory(str(root))
+    assert manager.create_file("fresh.log")["success"]
+    assert manager.search_files("fresh", str(root))["total"] == 1
+
+
+def test_index_persists_between_managers(tmp_path):
+    root = make_tree(tmp_path / "tree", files=["kept"])
+    index_file = str(tmp_path / "index" / "files.db")
+    first = fo.FileManager(index_file=index_file)
+    try:
+        assert first.search_files("kept", str(root))["total"] == 1
+    finally:
+        first._close()
+
+    second = fo.FileManager(index_file=index_file)
+    try:
+        assert second._get_file_index().find_root(str(root))[0] == str(root)
+    finally:
+        second._close()